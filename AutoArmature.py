@@ -14,62 +14,90 @@ class OBJECT_OT_auto_armature_weight_paint(bpy.types.Operator):
 
     def execute(self, context):
         obj = context.active_object
-        if obj and obj.type == 'MESH':
-            for modifier in obj.modifiers:
-                if modifier.type == 'ARMATURE' and modifier.object:
-                    context.view_layer.objects.active = modifier.object
-                    modifier.object.select_set(True)
+        if not obj or obj.type != 'MESH':
+            return {'FINISHED'}
 
-                    context.view_layer.objects.active = obj
-                    obj.select_set(True)
+        armatures = find_driving_armatures(obj)
+        if not armatures:
+            return {'FINISHED'}
 
-                    bpy.ops.object.mode_set(mode='OBJECT')
-                    bpy.ops.object.mode_set(mode='WEIGHT_PAINT')
-                    print("AAS: Done")
-                    break
+        # Entering weight paint with the armatures selected already put them in pose mode
+        if obj.mode == 'WEIGHT_PAINT' and all(armature.select_get() and armature.mode == 'POSE' for armature in armatures):
+            return {'FINISHED'}
+
+        for armature in armatures:
+            armature.select_set(True)
+        context.view_layer.objects.active = obj
+        obj.select_set(True)
+
+        # Armatures only join pose mode when weight paint is entered, so a running session has to be re-entered
+        if obj.mode == 'WEIGHT_PAINT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+        bpy.ops.object.mode_set(mode='WEIGHT_PAINT')
+        print("AAS: Done")
 
         return {'FINISHED'}
 
-def auto_armature_weight_paint_handler(scene):
-    if  bpy.context.mode != 'PAINT_WEIGHT' and not (bpy.context.mode == 'OBJECT' and getattr(scene, "auto_armature_progress", True)):
-        scene.auto_armature_executed = False
-        print("AAS: Reset")
+def find_driving_armatures(obj):
+    armatures = []
+    for modifier in obj.modifiers:
+        if modifier.type == 'ARMATURE' and modifier.object and modifier.object.type == 'ARMATURE':
+            if modifier.object not in armatures:
+                armatures.append(modifier.object)
+
+    parent = obj.parent
+    while parent:
+        if parent.type == 'ARMATURE' and parent not in armatures:
+            armatures.append(parent)
+        parent = parent.parent
+    return armatures
 
-    if bpy.context.mode == 'PAINT_WEIGHT' and not getattr(scene, "auto_armature_executed", False):
-        scene.auto_armature_executed = True
-        scene.auto_armature_progress = True
+# Owner of the Object.mode subscription, so it can be cleared before subscribing again
+aas_msgbus_owner = object()
+# Set once the operator ran for the current weight paint session
+aas_executed = False
+
+def auto_armature_mode_changed():
+    global aas_executed
+    if bpy.context.mode != 'PAINT_WEIGHT':
+        aas_executed = False
+        return
+
+    if not aas_executed:
+        aas_executed = True
         print("AAS: Start")
         bpy.ops.object.auto_armature_weight_paint()
         print("AAS: End")
-        scene.auto_armature_progress = False
+
+def subscribe_mode_change():
+    bpy.msgbus.clear_by_owner(aas_msgbus_owner)
+    bpy.msgbus.subscribe_rna(
+        key=(bpy.types.Object, "mode"),
+        owner=aas_msgbus_owner,
+        args=(),
+        notify=auto_armature_mode_changed,
+        options={'PERSISTENT'},
+    )
 
 @persistent
 def load_post_handler(dummy):
-    print("AAS: Handler registered")
-    bpy.app.handlers.depsgraph_update_post.append(auto_armature_weight_paint_handler)
-    bpy.app.handlers.frame_change_post.append(auto_armature_weight_paint_handler)
-    
+    # msgbus subscriptions do not survive loading a file
+    subscribe_mode_change()
+    print("AAS: Subscribed to mode changes")
 
 def register():
     bpy.utils.register_class(OBJECT_OT_auto_armature_weight_paint)
-    bpy.types.Scene.auto_armature_executed = bpy.props.BoolProperty(default=False)
-    bpy.types.Scene.auto_armature_progress = bpy.props.BoolProperty(default=False)
 
-    bpy.app.handlers.load_post.append(load_post_handler)
-    bpy.app.handlers.depsgraph_update_post.append(auto_armature_weight_paint_handler)
-    bpy.app.handlers.frame_change_post.append(auto_armature_weight_paint_handler)
-    print("AAS: Loaded (frame_change_post)")
+    if load_post_handler not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(load_post_handler)
+    subscribe_mode_change()
+    print("AAS: Loaded (msgbus)")
 
 def unregister():
     bpy.utils.unregister_class(OBJECT_OT_auto_armature_weight_paint)
-    if auto_armature_weight_paint_handler in bpy.app.handlers.depsgraph_update_post:
-        bpy.app.handlers.frame_change_post.remove(auto_armature_weight_paint_handler)
-    if auto_armature_weight_paint_handler in bpy.app.handlers.depsgraph_update_post:
-        bpy.app.handlers.depsgraph_update_post.remove(auto_armature_weight_paint_handler)
+    bpy.msgbus.clear_by_owner(aas_msgbus_owner)
     if load_post_handler in bpy.app.handlers.load_post:
         bpy.app.handlers.load_post.remove(load_post_handler)
-    del bpy.types.Scene.auto_armature_executed
-    del bpy.types.Scene.auto_armature_progress
 
 if __name__ == "__main__":
     register()
@@ -9,80 +9,222 @@ bl_info = {
 }
 
 import bpy
-import bmesh
-from mathutils import Vector
+import numpy as np
+from collections import OrderedDict
 
 # Глобальная переменная для управления обновлениями
 bst_disable_update = False
 
+# Сколько ключей сглаживается одной стопкой (N x K x 3). На мешах 5k-90k вершин 3 ключа в 1.6-2.5 раза
+# быстрее поключевого прохода, а стопки крупнее снова медленнее из-за размера промежуточного массива
+BST_BATCH_KEYS = 3
+# Задержка пересчёта превью после последнего изменения настроек, секунды
+BST_PREVIEW_DELAY = 0.15
+
+# Кеш превью: объект, базис, смежность и исходные координаты всех ключей
+bst_preview_cache = {}
+# Ключи, ожидающие пересчёта превью (None - все ключи)
+bst_pending_keys = set()
+
+# Промежуточные итерации превью: (ключ, сила, итерация) -> смещения, вытесняются по LRU
+BST_ITERATION_CACHE_BYTES = 256 * 1024 * 1024
+bst_iteration_cache = OrderedDict()
+bst_iteration_cache_bytes = 0
+
 class BST_BlendShapeItem(bpy.types.PropertyGroup):
     bst_name: bpy.props.StringProperty(name="Name")
     bst_select: bpy.props.BoolProperty(name="Select", default=False, update=lambda self, context: bst_update_select(self, context))
 
-class BST_VertexPosition(bpy.types.PropertyGroup):
-    bst_x: bpy.props.FloatProperty(name="X")
-    bst_y: bpy.props.FloatProperty(name="Y")
-    bst_z: bpy.props.FloatProperty(name="Z")
-
 class BST_BlendShapeProperties(bpy.types.PropertyGroup):
     bst_all_blendshapes: bpy.props.BoolProperty(name="All Blendshapes", default=True, update=lambda self, context: bst_update_all_blendshapes(self, context))
     bst_iterations: bpy.props.IntProperty(name="Iterations", default=1, min=1, max=10, update=lambda self, context: bst_update_iterations(self, context))
     bst_preview: bpy.props.BoolProperty(name="Preview", default=False, update=lambda self, context: bst_update_preview(self, context))
     bst_selected_blendshapes: bpy.props.CollectionProperty(type=BST_BlendShapeItem)
-    bst_original_positions: bpy.props.CollectionProperty(type=BST_VertexPosition)
     bst_selected_object: bpy.props.PointerProperty(name="Selected Object", type=bpy.types.Object)
     bst_strength: bpy.props.FloatProperty(name="Strength", default=0.5, min=0.0, max=1.0, update=lambda self, context: bst_update_strength(self, context))
 
+def bst_preview_allowed(context):
+    """Превью сглаживания не пересчитывается, пока активно превью переноса блендшейпов"""
+    return not hasattr(context.scene, 'stt_shapekey_transfer_props') or not context.scene.stt_shapekey_transfer_props.stt_preview
+
 def bst_update_select(self, context):
     global bst_disable_update
     if bst_disable_update:
         return
     props = context.scene.bst_blendshape_props
-    if not hasattr(context.scene, 'stt_shapekey_transfer_props') or not context.scene.stt_shapekey_transfer_props.stt_preview:
-        if props.bst_preview:
-            bpy.ops.object.bst_restore_original_values('INVOKE_DEFAULT')
-            bpy.ops.object.bst_smooth_blendshapes('INVOKE_DEFAULT')
+    if bst_preview_allowed(context) and props.bst_preview:
+        bst_schedule_preview([self.bst_name])
 
 def bst_update_all_blendshapes(self, context):
     global bst_disable_update
     if bst_disable_update:
         return
     props = context.scene.bst_blendshape_props
-    if not hasattr(context.scene, 'stt_shapekey_transfer_props') or not context.scene.stt_shapekey_transfer_props.stt_preview:
-        if props.bst_all_blendshapes and props.bst_preview:
-            bpy.ops.object.bst_restore_original_values('INVOKE_DEFAULT')
-            bpy.ops.object.bst_smooth_blendshapes('INVOKE_DEFAULT')
+    if bst_preview_allowed(context) and props.bst_preview:
+        bst_schedule_preview()
 
 def bst_update_iterations(self, context):
     global bst_disable_update
     if bst_disable_update:
         return
     props = context.scene.bst_blendshape_props
-    if not hasattr(context.scene, 'stt_shapekey_transfer_props') or not context.scene.stt_shapekey_transfer_props.stt_preview:
-        if props.bst_preview:
-            bpy.ops.object.bst_restore_original_values('INVOKE_DEFAULT')
-            bpy.ops.object.bst_smooth_blendshapes('INVOKE_DEFAULT')
+    if bst_preview_allowed(context) and props.bst_preview:
+        bst_schedule_preview()
 
 def bst_update_strength(self, context):
     global bst_disable_update
     if bst_disable_update:
         return
     props = context.scene.bst_blendshape_props
-    if not hasattr(context.scene, 'stt_shapekey_transfer_props') or not context.scene.stt_shapekey_transfer_props.stt_preview:
-        if props.bst_preview:
-            bpy.ops.object.bst_restore_original_values('INVOKE_DEFAULT')
-            bpy.ops.object.bst_smooth_blendshapes('INVOKE_DEFAULT')
+    if bst_preview_allowed(context) and props.bst_preview:
+        bst_schedule_preview()
 
 def bst_update_preview(self, context):
     global bst_disable_update
     if bst_disable_update:
         return
-    if not hasattr(context.scene, 'stt_shapekey_transfer_props') or not context.scene.stt_shapekey_transfer_props.stt_preview:
+    if bst_preview_allowed(context):
         if self.bst_preview:
-            bpy.ops.object.bst_save_original_values('INVOKE_DEFAULT')
-            bpy.ops.object.bst_smooth_blendshapes('INVOKE_DEFAULT')
+            bst_save_original_values(self.bst_selected_object)
+            bst_recompute_preview(self)
         else:
-            bpy.ops.object.bst_restore_original_values('INVOKE_DEFAULT')
+            bst_cancel_preview_timer()
+            bst_restore_original_values(self.bst_selected_object)
+            bst_preview_cache.clear()
+            bst_clear_iteration_cache()
+
+def bst_save_original_values(obj):
+    """Запоминает базис, смежность и исходные координаты всех ключей объекта"""
+    bst_preview_cache.clear()
+    bst_clear_iteration_cache()
+    if not obj or obj.type != 'MESH' or not obj.data.shape_keys:
+        return False
+
+    mesh = obj.data
+    count = len(mesh.vertices)
+    bst_preview_cache["object"] = obj.name
+    bst_preview_cache["basis"] = bst_read_coords(mesh.shape_keys.key_blocks['Basis'].data, count)
+    bst_preview_cache["adjacency"] = bst_build_adjacency(mesh)
+    bst_preview_cache["originals"] = {key_block.name: bst_read_coords(key_block.data, count)
+                                      for key_block in mesh.shape_keys.key_blocks}
+    return True
+
+def bst_restore_original_values(obj, names=None):
+    """Возвращает ключам объекта исходные координаты из кеша"""
+    if not obj or bst_preview_cache.get("object") != obj.name or not obj.data.shape_keys:
+        return False
+
+    originals = bst_preview_cache["originals"]
+    for name in (originals if names is None else names):
+        key_block = obj.data.shape_keys.key_blocks.get(name)
+        if key_block and name in originals:
+            key_block.data.foreach_set("co", originals[name].ravel())
+    obj.data.update()
+    return True
+
+def bst_requested_keys(props):
+    """Имена ключей, которые сглаживаются при текущем выборе"""
+    selected_keys = {item.bst_name for item in props.bst_selected_blendshapes if item.bst_select}
+    return [name for name in bst_preview_cache.get("originals", ())
+            if name != 'Basis' and (props.bst_all_blendshapes or name in selected_keys)]
+
+def bst_recompute_preview(props, names=None):
+    """Пересчитывает превью для указанных ключей прямо из кеша исходных смещений"""
+    obj = props.bst_selected_object
+    if not obj or bst_preview_cache.get("object") != obj.name or not obj.data.shape_keys:
+        return
+
+    requested = bst_requested_keys(props)
+    if names is None:
+        names = bst_preview_cache["originals"].keys()
+    smooth_names = [name for name in requested if name in names]
+    restore_names = [name for name in names if name not in requested]
+
+    bst_restore_original_values(obj, restore_names)
+    if not smooth_names:
+        return
+
+    basis_co = bst_preview_cache["basis"]
+    adjacency = bst_preview_cache["adjacency"]
+    originals = bst_preview_cache["originals"]
+    key_blocks = obj.data.shape_keys.key_blocks
+    iterations = props.bst_iterations
+    strength = props.bst_strength
+
+    # Каждый ключ продолжает с последней закешированной итерации; ключи с одинаковой итерацией сглаживаются стопкой
+    groups = {}
+    for name in smooth_names:
+        done, state = bst_get_cached_iteration(name, strength, iterations)
+        groups.setdefault(done, []).append((name, state))
+
+    for done, items in groups.items():
+        for start in range(0, len(items), BST_BATCH_KEYS):
+            batch = items[start:start + BST_BATCH_KEYS]
+            offsets = np.stack([originals[name] - basis_co if state is None else state for name, state in batch], axis=1)
+            for iteration in range(done + 1, iterations + 1):
+                offsets = bst_smooth_offsets(offsets, adjacency, 1, strength)
+                for i, (name, _) in enumerate(batch):
+                    bst_put_cached_iteration(name, strength, iteration, offsets[:, i].copy())
+
+            for i, (name, _) in enumerate(batch):
+                key_block = key_blocks.get(name)
+                if key_block:
+                    key_block.data.foreach_set("co", (basis_co + offsets[:, i]).ravel())
+    obj.data.update()
+
+def bst_get_cached_iteration(name, strength, iterations):
+    """Последняя закешированная итерация ключа не дальше iterations: (номер, смещения) или (0, None)"""
+    for iteration in range(iterations, 0, -1):
+        cache_key = (name, strength, iteration)
+        state = bst_iteration_cache.get(cache_key)
+        if state is not None:
+            bst_iteration_cache.move_to_end(cache_key)
+            return iteration, state
+    return 0, None
+
+def bst_put_cached_iteration(name, strength, iteration, offsets):
+    """Кеширует итерацию ключа и вытесняет давно не использованные при превышении бюджета памяти"""
+    global bst_iteration_cache_bytes
+    cache_key = (name, strength, iteration)
+    if cache_key in bst_iteration_cache:
+        return
+
+    bst_iteration_cache[cache_key] = offsets
+    bst_iteration_cache_bytes += offsets.nbytes
+    while bst_iteration_cache_bytes > BST_ITERATION_CACHE_BYTES and len(bst_iteration_cache) > 1:
+        _, evicted = bst_iteration_cache.popitem(last=False)
+        bst_iteration_cache_bytes -= evicted.nbytes
+
+def bst_clear_iteration_cache():
+    global bst_iteration_cache_bytes
+    bst_iteration_cache.clear()
+    bst_iteration_cache_bytes = 0
+
+def bst_schedule_preview(names=None):
+    """Откладывает пересчёт превью, чтобы быстрые изменения слайдеров сливались в один пересчёт"""
+    global bst_pending_keys
+    if names is None or bst_pending_keys is None:
+        bst_pending_keys = None
+    else:
+        bst_pending_keys.update(names)
+
+    bst_cancel_preview_timer()
+    bpy.app.timers.register(bst_preview_timer, first_interval=BST_PREVIEW_DELAY)
+
+def bst_cancel_preview_timer():
+    if bpy.app.timers.is_registered(bst_preview_timer):
+        bpy.app.timers.unregister(bst_preview_timer)
+
+def bst_preview_timer():
+    """Таймер отложенного пересчёта превью"""
+    global bst_pending_keys
+    names = bst_pending_keys
+    bst_pending_keys = set()
+
+    props = bpy.context.scene.bst_blendshape_props
+    if props.bst_preview:
+        bst_recompute_preview(props, names)
+    return None
 
 class BST_SaveOriginalValuesOperator(bpy.types.Operator):
     bl_idname = "object.bst_save_original_values"
@@ -91,24 +233,8 @@ class BST_SaveOriginalValuesOperator(bpy.types.Operator):
 
     def execute(self, context):
         props = context.scene.bst_blendshape_props
-        obj = props.bst_selected_object
-
-        if not obj or obj.type != 'MESH':
-            return {'CANCELLED'}
-
-        shape_keys = obj.data.shape_keys
-        if not shape_keys:
+        if not bst_save_original_values(props.bst_selected_object):
             return {'CANCELLED'}
-
-        props.bst_original_positions.clear()
-
-        for key_block in shape_keys.key_blocks:
-            for v in key_block.data:
-                pos = props.bst_original_positions.add()
-                pos.bst_x = v.co.x
-                pos.bst_y = v.co.y
-                pos.bst_z = v.co.z
-
         return {'FINISHED'}
 
 class BST_RestoreOriginalValuesOperator(bpy.types.Operator):
@@ -118,22 +244,8 @@ class BST_RestoreOriginalValuesOperator(bpy.types.Operator):
 
     def execute(self, context):
         props = context.scene.bst_blendshape_props
-        obj = props.bst_selected_object
-
-        if not obj or obj.type != 'MESH':
-            return {'CANCELLED'}
-
-        shape_keys = obj.data.shape_keys
-        if not shape_keys or not props.bst_original_positions:
+        if not bst_restore_original_values(props.bst_selected_object):
             return {'CANCELLED'}
-
-        index = 0
-        for key_block in shape_keys.key_blocks:
-            for vert in key_block.data:
-                orig_pos = props.bst_original_positions[index]
-                vert.co = Vector((orig_pos.bst_x, orig_pos.bst_y, orig_pos.bst_z))
-                index += 1
-
         return {'FINISHED'}
 
 class BST_UpdateBlendShapesOperator(bpy.types.Operator):
@@ -181,46 +293,73 @@ class BST_SmoothBlendShapesOperator(bpy.types.Operator):
 
         selected_keys = [item.bst_name for item in props.bst_selected_blendshapes if item.bst_select]
 
-        # Перебор всех shape keys для сглаживания
-        for key_block in shape_keys.key_blocks:
-            if key_block.name != 'Basis' and (props.bst_all_blendshapes or key_block.name in selected_keys):
-                self.smooth_shape_key(obj, basis_key, key_block, props.bst_iterations, props.bst_strength)
-
-        self.report({'INFO'}, "Blendshapes smoothed successfully")
-        return {'FINISHED'}
-
-    def smooth_shape_key(self, obj, basis_key, key_block, iterations, strength):
-        # Получение данных shape key
-        key_verts = key_block.data
-        basis_verts = basis_key.data
-
-        for _ in range(iterations):
-            new_offsets = [Vector((0, 0, 0))] * len(key_verts)
-
-            bm = bmesh.new()
-            bm.from_object(obj, bpy.context.evaluated_depsgraph_get())
-            bm.verts.ensure_lookup_table()
+        # Смежность и базис не зависят от ключа, поэтому читаем их один раз
+        mesh = obj.data
+        count = len(mesh.vertices)
+        adjacency = bst_build_adjacency(mesh)
+        basis_co = bst_read_coords(basis_key.data, count)
 
-            for vert in bm.verts:
-                basis_co = basis_verts[vert.index].co
-                key_co = key_verts[vert.index].co
-                offset = key_co - basis_co
+        key_blocks = [key_block for key_block in shape_keys.key_blocks
+                      if key_block.name != 'Basis' and (props.bst_all_blendshapes or key_block.name in selected_keys)]
 
-                neighbor_offsets = [offset]
-                for edge in vert.link_edges:
-                    neighbor_vert = edge.other_vert(vert)
-                    neighbor_basis_co = basis_verts[neighbor_vert.index].co
-                    neighbor_key_co = key_verts[neighbor_vert.index].co
-                    neighbor_offset = neighbor_key_co - neighbor_basis_co
-                    neighbor_offsets.append(neighbor_offset)
+        # Ключи сглаживаются небольшими стопками (N x K x 3) за один проход
+        for start in range(0, len(key_blocks), BST_BATCH_KEYS):
+            batch = key_blocks[start:start + BST_BATCH_KEYS]
+            offsets = np.empty((count, len(batch), 3), dtype=np.float32)
+            for i, key_block in enumerate(batch):
+                offsets[:, i] = bst_read_coords(key_block.data, count) - basis_co
 
-                avg_offset = sum(neighbor_offsets, Vector()) / len(neighbor_offsets)
-                new_offsets[vert.index] = offset.lerp(avg_offset, strength)
+            offsets = bst_smooth_offsets(offsets, adjacency, props.bst_iterations, props.bst_strength)
+            for i, key_block in enumerate(batch):
+                key_block.data.foreach_set("co", (basis_co + offsets[:, i]).ravel())
 
-            for i, offset in enumerate(new_offsets):
-                key_verts[i].co = basis_verts[i].co + offset
+        mesh.update()
+        self.report({'INFO'}, "Blendshapes smoothed successfully")
+        return {'FINISHED'}
 
-            bm.free()
+def bst_read_coords(data, count):
+    """Читает координаты вершин shape key одним вызовом foreach_get"""
+    coords = np.empty(count * 3, dtype=np.float32)
+    data.foreach_get("co", coords)
+    return coords.reshape(count, 3)
+
+def bst_build_adjacency(mesh):
+    """Строит смежность вершин по рёбрам меша в виде CSR (indptr, indices)"""
+    count = len(mesh.vertices)
+    edges = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+    mesh.edges.foreach_get("vertices", edges)
+    edges = edges.reshape(-1, 2)
+
+    rows = np.concatenate((edges[:, 0], edges[:, 1]))
+    cols = np.concatenate((edges[:, 1], edges[:, 0]))
+    order = np.argsort(rows, kind='stable')
+
+    indptr = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=count), out=indptr[1:])
+    return indptr, cols[order]
+
+def bst_smooth_offsets(offsets, adjacency, iterations, strength):
+    """Сглаживает смещения (N x 3) или стопку ключей (N x K x 3), сдвигая их к среднему по вершине и соседям"""
+    indptr, indices = adjacency
+    shape = offsets.shape
+    # Строка на вершину: соседи собираются сплошными строками, а не тройками по ключам
+    offsets = offsets.reshape(shape[0], -1)
+    degree = np.diff(indptr)
+    has_neighbors = degree > 0
+    starts = indptr[:-1][has_neighbors]
+    scale = (1.0 / (degree + 1)).astype(offsets.dtype)[:, None]
+
+    gathered = np.empty((len(indices), offsets.shape[1]), dtype=offsets.dtype)
+    sums = np.empty((len(starts), offsets.shape[1]), dtype=offsets.dtype)
+    neighbor_sum = np.zeros_like(offsets)
+    for _ in range(iterations):
+        if len(starts):
+            np.take(offsets, indices, axis=0, out=gathered)
+            np.add.reduceat(gathered, starts, axis=0, out=sums)
+            neighbor_sum[has_neighbors] = sums
+        average = (offsets + neighbor_sum) * scale
+        offsets = offsets + (average - offsets) * strength
+    return offsets.reshape(shape)
 
 class BST_BlendShapePanel(bpy.types.Panel):
     bl_label = "Blendshape Smoothing"
@@ -252,7 +391,6 @@ class BST_BlendShapePanel(bpy.types.Panel):
 
 def register():
     bpy.utils.register_class(BST_BlendShapeItem)
-    bpy.utils.register_class(BST_VertexPosition)
     bpy.utils.register_class(BST_BlendShapeProperties)
     bpy.utils.register_class(BST_SaveOriginalValuesOperator)
     bpy.utils.register_class(BST_RestoreOriginalValuesOperator)
@@ -264,7 +402,6 @@ def register():
 
 def unregister():
     bpy.utils.unregister_class(BST_BlendShapeItem)
-    bpy.utils.unregister_class(BST_VertexPosition)
     bpy.utils.unregister_class(BST_BlendShapeProperties)
     bpy.utils.unregister_class(BST_SaveOriginalValuesOperator)
     bpy.utils.unregister_class(BST_RestoreOriginalValuesOperator)
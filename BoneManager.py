@@ -11,9 +11,14 @@ bl_info = {
 }
 
 import bpy
+from bpy.app.handlers import persistent
 import numpy as np
-import bmesh
 import mathutils
+import re
+import fnmatch
+import os
+import csv
+import json
 
 class UVToolPanel(bpy.types.Panel):
     bl_label = "UV Tools"
@@ -26,7 +31,9 @@ class UVToolPanel(bpy.types.Panel):
         layout = self.layout
         box = layout.box()
         row = box.row()
-        row.operator("uv.straighten_uv_operator", text="Straighten UVs")
+        row.operator("uv.straighten_uv_operator", text="Straighten UVs").mode = 'QUAD'
+        row = box.row()
+        row.operator("uv.straighten_uv_operator", text="Straighten UV Islands").mode = 'ISLANDS'
 
 class BoneManager(bpy.types.Panel):
     bl_label = "Bone Manager by EchoVRC"
@@ -60,6 +67,7 @@ class BoneManager(bpy.types.Panel):
         box.label(text="Playbooks:")
         actions = [
             ("view3d.delete_unused_blendshape", "Delete unused blendshape"),
+            ("view3d.shape_key_sparsity_report", "Shape key sparsity report"),
             ("view3d.delete_unused_vertex_groups", "Delete unused vertex groups"),
             ("view3d.delete_unused_bones", "Delete unused bones"),
             ("view3d.remove_shapekey_influence", "Remove Shapekey Influence"),
@@ -75,16 +83,87 @@ class BoneManager(bpy.types.Panel):
                 row.label(text="(Don't forget check vrc.sil)")
 
     def draw_statistics(self, layout):
-        total_meshes, total_materials = self.calculate_statistics()
-        layout.label(text=f"Meshes: {total_meshes}")
-        layout.label(text=f"Materials: {total_materials}")
+        stats = self.calculate_statistics()
+        row = layout.row()
+        row.label(text=f"Meshes: {stats['meshes']}")
+        row.operator(RefreshStatistics.bl_idname, text="", icon='FILE_REFRESH')
+        layout.label(text=f"Skinned Meshes: {stats['skinned_meshes']}")
+        layout.label(text=f"Triangles: {stats['triangles']}")
+        layout.label(text=f"Materials: {stats['materials']}")
+        layout.label(text=f"Bones: {stats['bones']}")
+        layout.label(text=f"Shape Keys: {stats['shape_keys']}")
         layout.label(text="My discord: echovrc")
 
     @staticmethod
     def calculate_statistics():
-        total_meshes = sum(1 for obj in bpy.data.objects if obj.type == 'MESH' and obj.visible_get())
-        total_materials = sum(len(obj.material_slots) for obj in bpy.data.objects if obj.type == 'MESH' and obj.visible_get())
-        return total_meshes, total_materials
+        global scene_statistics, scene_statistics_object_count
+        if scene_statistics is None:
+            scene_statistics = compute_statistics()
+            scene_statistics_object_count = len(bpy.data.objects)
+        return scene_statistics
+
+# Cached panel statistics, reset by depsgraph updates of relevant data and recomputed on the next redraw
+scene_statistics = None
+# Object count at the last recount, so added or removed objects reset the cache
+scene_statistics_object_count = 0
+
+def compute_statistics():
+    stats = dict(meshes=0, skinned_meshes=0, triangles=0, materials=0, bones=0, shape_keys=0)
+    for obj in bpy.data.objects:
+        if obj.type not in {'MESH', 'ARMATURE'} or not obj.visible_get():
+            continue
+
+        if obj.type == 'ARMATURE':
+            stats['bones'] += len(obj.data.bones)
+            continue
+
+        mesh = obj.data
+        stats['meshes'] += 1
+        stats['materials'] += len(obj.material_slots)
+        if any(modifier.type == 'ARMATURE' and modifier.object for modifier in obj.modifiers):
+            stats['skinned_meshes'] += 1
+        if mesh.shape_keys:
+            stats['shape_keys'] += len(mesh.shape_keys.key_blocks) - 1
+
+        loop_totals = np.empty(len(mesh.polygons), dtype=np.int32)
+        mesh.polygons.foreach_get("loop_total", loop_totals)
+        stats['triangles'] += int(loop_totals.sum()) - 2 * len(loop_totals)
+    return stats
+
+def invalidate_statistics():
+    global scene_statistics
+    scene_statistics = None
+
+@persistent
+def statistics_depsgraph_handler(scene, depsgraph):
+    if scene_statistics is None:
+        return
+    if len(bpy.data.objects) != scene_statistics_object_count:
+        invalidate_statistics()
+        return
+
+    # Posing and moving objects update their geometry or transform without changing any count.
+    # Hiding objects or editing their material slots and modifiers only tags the object or the scene.
+    for update in depsgraph.updates:
+        if isinstance(update.id, (bpy.types.Mesh, bpy.types.Material, bpy.types.Collection, bpy.types.Key, bpy.types.Scene)):
+            invalidate_statistics()
+            return
+        if isinstance(update.id, bpy.types.Object) and not update.is_updated_geometry and not update.is_updated_transform:
+            invalidate_statistics()
+            return
+
+@persistent
+def statistics_load_handler(dummy):
+    invalidate_statistics()
+
+class RefreshStatistics(bpy.types.Operator):
+    bl_idname = "view3d.refresh_statistics"
+    bl_label = "Refresh Statistics"
+    bl_description = "Recount the scene statistics"
+
+    def execute(self, context):
+        invalidate_statistics()
+        return {'FINISHED'}
 
 class MakeSingleUser(bpy.types.Operator):
     bl_idname = "view3d.make_single_user"
@@ -92,126 +171,517 @@ class MakeSingleUser(bpy.types.Operator):
     bl_description = "Make selected objects single user"
 
     def execute(self, context):
-        bpy.ops.object.make_single_user(type='SELECTED_OBJECTS', object=True, obdata=True)
+        make_single_user(context, bpy.context.selected_objects)
         return {'FINISHED'}
 
+def make_single_user(context, objects):
+    shared = [ob.name for ob in objects if ob.users > 1 or (ob.data and ob.data.users > 1)]
+    if not shared:
+        return shared
+
+    for ob in context.view_layer.objects.selected:
+        ob.select_set(False)
+    for ob in objects:
+        ob.select_set(True)
+    bpy.ops.object.make_single_user(type='SELECTED_OBJECTS', object=True, obdata=True)
+    return shared
+
 class SmoothWeights3D(bpy.types.Operator):
     bl_idname = "view3d.smooth_weights_3d"
     bl_label = "Smooth Weights 3D"
     bl_description = "Smooth vertex group weights based on 3D position"
+    bl_options = {'REGISTER', 'UNDO'}
     
     radius: bpy.props.FloatProperty(name="Radius", default=0.1, min=0.01, max=10.0)
     influence: bpy.props.FloatProperty(name="Influence", default=0.5, min=0.0, max=1.0)
     iterations: bpy.props.IntProperty(name="Iterations", default=1, min=1, max=100)
+    only_selected: bpy.props.BoolProperty(name="Only Selected Vertices", default=False)
+    group_scope: bpy.props.EnumProperty(
+        name="Groups",
+        items=[
+            ('ALL', "All", "Smooth every vertex group"),
+            ('ACTIVE', "Active", "Smooth only the active vertex group"),
+            ('NAMED', "Named", "Smooth the vertex groups listed in Group Names"),
+            ('DEFORM', "Deform Bones", "Smooth the vertex groups of deforming bones"),
+        ],
+        default='ALL',
+    )
+    group_names: bpy.props.StringProperty(name="Group Names", description="Comma separated vertex group names")
     
     def execute(self, context):
         obj = bpy.context.object
-        for _ in range(self.iterations):
-            smooth_weights_3d_global(obj, self.radius, self.influence)
-        return {'FINISHED'}
+        if not obj or obj.type != 'MESH':
+            self.report({'WARNING'}, "Active object is not a mesh.")
+            return {'CANCELLED'}
 
-def smooth_weights_3d_global(obj, radius=0.1, influence=0.5):
-    mesh = obj.data
-    bm = bmesh.new()
-    bm.from_mesh(mesh)
-    
-    kd = mathutils.kdtree.KDTree(len(bm.verts))
-    for i, v in enumerate(bm.verts):
-        kd.insert(v.co, i)
-    kd.balance()
-    
-    vertex_layers = bm.verts.layers.deform.verify()
-    
-    for vert in bm.verts:
-        if not vert[vertex_layers]:  # Skip vertices without weights
-            continue
+        group_indices = self.resolve_group_indices(obj)
+        if group_indices is not None and not group_indices:
+            self.report({'WARNING'}, "No vertex groups to smooth.")
+            return {'CANCELLED'}
 
-        weights = {}
-        total_count = 0
+        # Edit-mode selection has to be flushed to the mesh, and weights cannot be added in edit mode
+        in_edit_mode = obj.mode == 'EDIT'
+        if in_edit_mode:
+            bpy.ops.object.mode_set(mode='OBJECT')
 
-        for (co, index, dist) in kd.find_range(vert.co, radius):
-            v = bm.verts[index]
-            for group, weight in v[vertex_layers].items():
-                weights[group] = weights.get(group, 0) + weight
-                total_count += 1
+        vertex_mask = None
+        if self.only_selected:
+            vertex_mask = np.zeros(len(obj.data.vertices), dtype=bool)
+            obj.data.vertices.foreach_get("select", vertex_mask)
 
-        if total_count == 0:
-            continue
+        smooth_weights_3d_global(obj, self.radius, self.influence, self.iterations, vertex_mask, group_indices)
+
+        if in_edit_mode:
+            bpy.ops.object.mode_set(mode='EDIT')
+        return {'FINISHED'}
 
-        for group, weight in weights.items():
-            vert[vertex_layers][group] = (1.0 - influence) * vert[vertex_layers].get(group, 0) + (influence * weight / total_count)
+    def resolve_group_indices(self, obj):
+        if self.group_scope == 'ACTIVE':
+            return [obj.vertex_groups.active_index] if obj.vertex_groups.active else []
+
+        if self.group_scope == 'NAMED':
+            names = {name.strip() for name in self.group_names.split(",") if name.strip()}
+            return [vg.index for vg in obj.vertex_groups if vg.name in names]
+
+        if self.group_scope == 'DEFORM':
+            bone_names = set()
+            for modifier in obj.modifiers:
+                if modifier.type == 'ARMATURE' and modifier.object and modifier.object.type == 'ARMATURE':
+                    bone_names.update(bone.name for bone in modifier.object.data.bones if bone.use_deform)
+            return [vg.index for vg in obj.vertex_groups if vg.name in bone_names]
+
+        return None
+
+def read_vertex_weights(mesh):
+    vertex_indices = []
+    group_indices = []
+    weights = []
+    for v in mesh.vertices:
+        for g in v.groups:
+            vertex_indices.append(v.index)
+            group_indices.append(g.group)
+            weights.append(g.weight)
+    return (np.array(vertex_indices, dtype=np.int64),
+            np.array(group_indices, dtype=np.int64),
+            np.array(weights, dtype=np.float32))
+
+def build_kdtree(coords):
+    kd = mathutils.kdtree.KDTree(len(coords))
+    for i, co in enumerate(coords.tolist()):
+        kd.insert(co, i)
+    kd.balance()
+    return kd
+
+def find_neighborhoods(kd, coords, query_indices, radius):
+    coords = coords.tolist()
+    rows = []
+    cols = []
+    for i in query_indices.tolist():
+        found = [index for (co, index, dist) in kd.find_range(coords[i], radius)]
+        rows.extend([i] * len(found))
+        cols.extend(found)
+    return np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)
+
+def concat_ranges(starts, lengths):
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(lengths.sum())
+
+def smooth_weights_3d_global(obj, radius=0.1, influence=0.5, iterations=1, vertex_mask=None, group_indices=None):
+    mesh = obj.data
+    nverts = len(mesh.vertices)
+    if group_indices is None:
+        group_indices = range(len(obj.vertex_groups))
+    group_indices = np.array(group_indices, dtype=np.int64)
+    ngroups = len(group_indices)
+    if not nverts or not ngroups:
+        return
+
+    vertex_indices, vertex_groups, weights = read_vertex_weights(mesh)
+    group_count = np.bincount(vertex_indices, minlength=nverts)
+
+    # Only weighted vertices inside the mask are updated
+    updatable = group_count > 0
+    if vertex_mask is not None:
+        updatable &= vertex_mask
+
+    # Vertices that carry a smoothed group; a vertex only gets a new weight if one of them is within the radius
+    column = np.full(len(obj.vertex_groups), -1, dtype=np.int64)
+    column[group_indices] = np.arange(ngroups)
+    in_scope = column[vertex_groups] >= 0
+    members = np.unique(vertex_indices[in_scope])
+    affected = np.flatnonzero(updatable)
+    if not len(affected) or not len(members):
+        return
+
+    coords = np.empty(nverts * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", coords)
+    coords = coords.reshape(nverts, 3)
+    kd = build_kdtree(coords)
+
+    # Seeding from the members pays off when the group scope is narrower than the updatable vertices.
+    # Vertices that receive a group become members for the next iteration, so the reach grows by one radius each time.
+    if len(members) < len(affected):
+        reached = np.zeros(nverts, dtype=bool)
+        reached[members] = True
+        near_member = np.zeros(nverts, dtype=bool)
+        frontier = members
+        for _ in range(iterations):
+            near = np.unique(find_neighborhoods(kd, coords, frontier, radius)[1])
+            near = near[updatable[near]]
+            near_member[near] = True
+            frontier = near[~reached[near]]
+            reached[frontier] = True
+            if not len(frontier):
+                break
+        affected = np.flatnonzero(near_member)
+        if not len(affected):
+            return
 
-    bm.to_mesh(mesh)
-    bm.free()
+    # Neighborhoods only depend on positions, so they are found once for all iterations
+    rows, cols = find_neighborhoods(kd, coords, affected, radius)
+
+    # The tables only cover the affected vertices and their neighbors, indexed by region row
+    region = np.union1d(affected, cols)
+    nregion = len(region)
+    local = np.full(nverts, -1, dtype=np.int64)
+    local[region] = np.arange(nregion)
+    rows, cols = local[rows], local[cols]
+    group_count = group_count[region]
+
+    # Only the smoothed groups get a column; the others only count towards the per-vertex entry count
+    in_scope &= local[vertex_indices] >= 0
+    entry_rows = local[vertex_indices[in_scope]]
+    entry_columns = column[vertex_groups[in_scope]]
+    weight_table = np.zeros((nregion, ngroups), dtype=np.float32)
+    member = np.zeros((nregion, ngroups), dtype=bool)
+    weight_table[entry_rows, entry_columns] = weights[in_scope]
+    member[entry_rows, entry_columns] = True
+
+    changed = np.zeros((nregion, ngroups), dtype=bool)
+    for _ in range(iterations):
+        # Weights are averaged over every (neighbor, group) entry found in the neighborhood
+        total_count = np.bincount(rows, weights=group_count[cols], minlength=nregion)
+
+        # Every pair reads the memberships of its neighbor, which are contiguous in row-major order
+        member_rows, member_columns = np.nonzero(member)
+        member_count = np.bincount(member_rows, minlength=nregion)
+        member_ptr = np.zeros(nregion + 1, dtype=np.int64)
+        np.cumsum(member_count, out=member_ptr[1:])
+        entries = concat_ranges(member_ptr[cols], member_count[cols])
+        if not len(entries):
+            break
+        cells = np.repeat(rows, member_count[cols]) * ngroups + member_columns[entries]
+        entry_weights = weight_table[member_rows[entries], member_columns[entries]]
+
+        group_sum = np.bincount(cells, weights=entry_weights, minlength=nregion * ngroups).reshape(nregion, ngroups)
+        targets = np.zeros(nregion * ngroups, dtype=bool)
+        targets[cells] = True
+        targets = targets.reshape(nregion, ngroups)
+
+        target_rows, target_columns = np.nonzero(targets)
+        new_weights = weight_table.copy()
+        new_weights[target_rows, target_columns] = ((1.0 - influence) * weight_table[target_rows, target_columns]
+                                                    + influence * group_sum[target_rows, target_columns] / total_count[target_rows])
+        group_count += (targets & ~member).sum(axis=1)
+        weight_table = new_weights
+        member |= targets
+        changed |= targets
+
+    # Transposed so each group's changed vertices are one contiguous run
+    changed_columns, changed_rows = np.nonzero(changed.T)
+    if not len(changed_columns):
+        return
+    run_starts = np.flatnonzero(np.r_[True, np.diff(changed_columns) != 0])
+    run_ends = np.r_[run_starts[1:], len(changed_columns)]
+    for start, end in zip(run_starts.tolist(), run_ends.tolist()):
+        group = changed_columns[start]
+        vertex_group = obj.vertex_groups[int(group_indices[group])]
+        target_rows = changed_rows[start:end]
+        for index, weight in zip(region[target_rows].tolist(), weight_table[target_rows, group].tolist()):
+            vertex_group.add([index], weight, 'REPLACE')
+
+def uv_target_objects(context):
+    if context.mode == 'EDIT_MESH':
+        objects = context.objects_in_mode_unique_data
+    else:
+        objects = context.selected_objects
+    return [ob for ob in objects if ob.type == 'MESH']
+
+def read_uv_layer(mesh, uv_layer, use_select_sync=False):
+    nloops = len(mesh.loops)
+    uvs = np.empty(nloops * 2, dtype=np.float32)
+    uv_layer.data.foreach_get("uv", uvs)
+
+    selected = np.zeros(nloops, dtype=bool)
+    if use_select_sync:
+        # With sync selection the UV editor shows the mesh selection
+        loop_vertices = np.empty(nloops, dtype=np.int32)
+        mesh.loops.foreach_get("vertex_index", loop_vertices)
+        vertex_select = np.zeros(len(mesh.vertices), dtype=bool)
+        mesh.vertices.foreach_get("select", vertex_select)
+        selected = vertex_select[loop_vertices]
+    elif hasattr(uv_layer, "vertex_selection"):
+        uv_layer.vertex_selection.foreach_get("value", selected)
+    else:
+        uv_layer.data.foreach_get("select", selected)
+    return uvs.reshape(nloops, 2), selected
+
+def edit_uv_maps(context, edit, all_uv_maps=False):
+    """Calls edit(mesh, uvs, selected) for the UV maps of every target object and writes back the ones it changed."""
+    objects = uv_target_objects(context)
+    use_select_sync = context.scene.tool_settings.use_uv_select_sync
+
+    # Edit-mode changes have to be flushed to the meshes before their arrays can be read
+    in_edit_mode = context.mode == 'EDIT_MESH'
+    if in_edit_mode:
+        bpy.ops.object.mode_set(mode='OBJECT')
+
+    changed_maps = 0
+    for ob in objects:
+        mesh = ob.data
+        mesh_changed = False
+        uv_layers = list(mesh.uv_layers) if all_uv_maps else [mesh.uv_layers.active]
+        for uv_layer in uv_layers:
+            if uv_layer is None:
+                continue
+            uvs, selected = read_uv_layer(mesh, uv_layer, use_select_sync)
+            if not selected.any():
+                continue
+            if edit(mesh, uvs, selected):
+                uv_layer.data.foreach_set("uv", uvs.reshape(-1))
+                changed_maps += 1
+                mesh_changed = True
+        if mesh_changed:
+            mesh.update()
+
+    if in_edit_mode:
+        bpy.ops.object.mode_set(mode='EDIT')
+    return changed_maps
 
 class DeleteSelectedUVVertices:
     @staticmethod
-    def execute():
-        obj = bpy.context.object
-        me = obj.data
-        bm = bmesh.from_edit_mesh(me)
-        uv_layer = bm.loops.layers.uv.verify()
-
-        for face in bm.faces:
-            for loop in face.loops:
-                uv_data = loop[uv_layer]
-                if uv_data.select:
-                    uv_data.uv = (0, 0)
+    def execute(context=None, all_uv_maps=False):
+        def collapse_selected(mesh, uvs, selected):
+            uvs[selected] = 0.0
+            return True
 
-        bmesh.update_edit_mesh(me)
+        return edit_uv_maps(context or bpy.context, collapse_selected, all_uv_maps)
 
 class DeleteUVVerticesOperator(bpy.types.Operator):
     bl_idname = "view3d.delete_uv_vertices"
     bl_label = "Delete Selected UV Vertices"
-    
+    bl_options = {'REGISTER', 'UNDO'}
+
+    all_uv_maps: bpy.props.BoolProperty(name="All UV Maps", default=False, description="Edit every UV map instead of only the active one")
+
     def execute(self, context):
-        DeleteSelectedUVVertices.execute()
+        changed_maps = DeleteSelectedUVVertices.execute(context, self.all_uv_maps)
+        self.report({'INFO'}, f"Collapsed selected UVs in {changed_maps} UV map(s)")
         return {'FINISHED'}
 
 class DeleteUnusedBones(bpy.types.Operator):
     bl_idname = "view3d.delete_unused_bones"
     bl_label = "Delete Unused Bones"
     bl_description = "Deletes all unused bones from the selected armature"
-
-    vertex_group_names = set()
-
-    @classmethod
-    def is_bone_or_child_used(cls, bone):
-        if bone.name in cls.vertex_group_names:
-            return True
-
-        return False
+    bl_options = {'REGISTER', 'UNDO'}
+
+    ignore_empty_groups: bpy.props.BoolProperty(
+        name="Ignore Empty Groups", default=False,
+        description="Bones whose vertex groups exist but carry no weight are treated as unused",
+    )
+    protect_humanoid: bpy.props.BoolProperty(
+        name="Protect Humanoid Bones", default=True,
+        description="Never delete bones with standard humanoid names",
+    )
+    protect_patterns: bpy.props.StringProperty(
+        name="Protect Patterns", default="",
+        description="Comma separated bone name patterns that are never deleted (e.g. Hair*, *_end)",
+    )
+    dry_run: bpy.props.BoolProperty(
+        name="Dry Run", default=False,
+        description="Only report the bones that would be deleted",
+    )
 
     def execute(self, context):
-        for ob in bpy.context.selected_objects:
-            if ob.type != 'ARMATURE': continue
-
-            armature = ob.data
-            bones_to_delete = set(armature.bones.keys())
-
-            mesh_objects = [obj for obj in bpy.data.objects if obj.type == 'MESH' and obj.parent == ob]
-
-            self.vertex_group_names.clear()
-            for mesh_obj in mesh_objects:
-                self.vertex_group_names.update(vg.name for vg in mesh_obj.vertex_groups)
+        delete_sets = delete_unused_bones(
+            context, bpy.context.selected_objects, self.ignore_empty_groups,
+            self.protect_humanoid, self.protect_patterns, self.dry_run,
+        )
+        if not delete_sets:
+            return {'FINISHED'}
 
-            for bone in armature.bones:
-                if self.is_bone_or_child_used(bone):
-                    bones_to_delete.discard(bone.name)
-                    parent = bone.parent
-                    while parent:
-                        bones_to_delete.discard(parent.name)
-                        parent = parent.parent
+        # One info-log entry per armature, so the bones can be reviewed before deleting them
+        for name, bones in delete_sets.items():
+            if bones:
+                self.report({'INFO'}, f"{name}: " + ", ".join(bones))
+        report = ", ".join(f"{name}: {len(bones)}" for name, bones in delete_sets.items())
+        self.report({'INFO'}, ("Bones to delete - " if self.dry_run else "Deleted bones - ") + report)
+        return {'FINISHED'}
 
-            print(bones_to_delete)
-            bpy.ops.object.mode_set(mode='EDIT')
-            for bone_name in bones_to_delete:
-                if bone_name in armature.edit_bones:
-                    edit_bone = armature.edit_bones[bone_name]
-                    armature.edit_bones.remove(edit_bone)
-            bpy.ops.object.mode_set(mode='OBJECT')
+def delete_unused_bones(context, objects, ignore_empty_groups=False, protect_humanoid=True, protect_patterns="", dry_run=False):
+    armature_objects = [ob for ob in objects if ob.type == 'ARMATURE']
+    if not armature_objects:
+        return {}
+
+    usage_index = build_armature_usage_index(bpy.data.objects, {ob.name for ob in armature_objects})
+    referenced_bones = find_referenced_bones()
+    patterns = [pattern.strip() for pattern in protect_patterns.split(",") if pattern.strip()]
+
+    delete_sets = {}
+    for ob in armature_objects:
+        weighted_groups, empty_groups = usage_index.get(ob.name, (set(), set()))
+        used_names = set(weighted_groups)
+        if not ignore_empty_groups:
+            used_names |= empty_groups
+        if empty_groups:
+            print(f"{ob.name}: {len(empty_groups)} vertex groups without weights")
+
+        protected = set(referenced_bones.get(ob.name, ()))
+        for bone in ob.data.bones:
+            if (protect_humanoid and is_humanoid_bone(bone.name)) \
+                    or any(fnmatch.fnmatchcase(bone.name, pattern) for pattern in patterns) \
+                    or any(key.lower().startswith("vrc") for key in bone.keys()):
+                protected.add(bone.name)
+
+        delete_sets[ob.name] = find_unused_bones(ob.data, used_names, protected)
+
+    for name, bones in delete_sets.items():
+        print(f"{name}: {sorted(bones)}")
+
+    if not dry_run:
+        delete_bones(context, armature_objects, delete_sets)
+    return {name: sorted(bones) for name, bones in delete_sets.items()}
+
+HUMANOID_BONE_NAMES = {
+    "hips", "spine", "chest", "upperchest", "neck", "head", "jaw", "eye", "shoulder", "upperarm",
+    "lowerarm", "hand", "upperleg", "lowerleg", "foot", "toes", "arm", "elbow", "wrist", "leg",
+    "knee", "ankle", "toe", "thumbproximal", "thumbintermediate", "thumbdistal", "indexproximal",
+    "indexintermediate", "indexdistal", "middleproximal", "middleintermediate", "middledistal",
+    "ringproximal", "ringintermediate", "ringdistal", "littleproximal", "littleintermediate", "littledistal",
+}
 
-        return {'FINISHED'}
+def is_humanoid_bone(name):
+    key = re.sub(r"^(left|right|l|r)[._ -]|[._ -](left|right|l|r)$", "", name.lower())
+    key = re.sub(r"^(left|right)", "", key)
+    return re.sub(r"[^a-z0-9]", "", key) in HUMANOID_BONE_NAMES
+
+BONE_PATH = re.compile(r'(?:pose\.)?bones\["((?:[^"\\]|\\.)*)"\]')
+
+def find_referenced_bones():
+    referenced = {}
+
+    def add(target, bone_name):
+        if target and target.type == 'ARMATURE' and bone_name:
+            referenced.setdefault(target.name, set()).add(bone_name)
+
+    for obj in bpy.data.objects:
+        constraints = list(obj.constraints)
+        if obj.pose:
+            for pose_bone in obj.pose.bones:
+                constraints.extend(pose_bone.constraints)
+        for constraint in constraints:
+            add(getattr(constraint, "target", None), getattr(constraint, "subtarget", ""))
+            add(getattr(constraint, "pole_target", None), getattr(constraint, "pole_subtarget", ""))
+            for target in getattr(constraint, "targets", ()):
+                add(target.target, target.subtarget)
+
+    for collection in (bpy.data.objects, bpy.data.shape_keys, bpy.data.armatures, bpy.data.meshes, bpy.data.materials):
+        for id_data in collection:
+            if not id_data.animation_data:
+                continue
+            for fcurve in id_data.animation_data.drivers:
+                if isinstance(id_data, bpy.types.Object):
+                    for bone_name in BONE_PATH.findall(fcurve.data_path):
+                        add(id_data, bone_name)
+                for variable in fcurve.driver.variables:
+                    for target in variable.targets:
+                        if not isinstance(target.id, bpy.types.Object):
+                            continue
+                        add(target.id, target.bone_target)
+                        for bone_name in BONE_PATH.findall(target.data_path):
+                            add(target.id, bone_name)
+
+    return referenced
+
+def find_unused_bones(armature, used_names, protected_names):
+    # Post-order walk: a bone is kept when it is used, protected or has a kept child
+    kept = set()
+    stack = [(bone, False) for bone in armature.bones if bone.parent is None]
+    while stack:
+        bone, children_done = stack.pop()
+        if not children_done:
+            stack.append((bone, True))
+            stack.extend((child, False) for child in bone.children)
+        elif bone.name in used_names or bone.name in protected_names or any(child.name in kept for child in bone.children):
+            kept.add(bone.name)
+    return {bone.name for bone in armature.bones if bone.name not in kept}
+
+def delete_bones(context, armature_objects, delete_sets):
+    armature_objects = [ob for ob in armature_objects if delete_sets.get(ob.name)]
+    if not armature_objects:
+        return
+
+    view_layer = context.view_layer
+    previous_selection = list(view_layer.objects.selected)
+    previous_active = view_layer.objects.active
+
+    # All armatures share one edit-mode session
+    for ob in previous_selection:
+        if ob.type != 'ARMATURE':
+            ob.select_set(False)
+    for ob in armature_objects:
+        ob.select_set(True)
+    view_layer.objects.active = armature_objects[0]
+
+    bpy.ops.object.mode_set(mode='EDIT')
+    for ob in armature_objects:
+        edit_bones = ob.data.edit_bones
+        for edit_bone in [edit_bone for edit_bone in edit_bones if edit_bone.name in delete_sets[ob.name]]:
+            edit_bones.remove(edit_bone)
+    bpy.ops.object.mode_set(mode='OBJECT')
+
+    for ob in view_layer.objects.selected:
+        ob.select_set(False)
+    for ob in previous_selection:
+        ob.select_set(True)
+    view_layer.objects.active = previous_active
+
+def find_armature_meshes(objects, armature_names=None):
+    meshes_by_armature = {}
+    for obj in objects:
+        if obj.type != 'MESH': continue
+
+        armatures = {modifier.object for modifier in obj.modifiers
+                     if modifier.type == 'ARMATURE' and modifier.object and modifier.object.type == 'ARMATURE'}
+        if obj.parent and obj.parent.type == 'ARMATURE':
+            armatures.add(obj.parent)
+
+        for armature_obj in armatures:
+            if armature_names is None or armature_obj.name in armature_names:
+                meshes_by_armature.setdefault(armature_obj.name, []).append(obj)
+    return meshes_by_armature
+
+def build_armature_usage_index(objects, armature_names=None):
+    group_usage = {}
+    usage_index = {}
+    # Only the meshes of the given armatures have their weights read
+    for armature_name, mesh_objects in find_armature_meshes(objects, armature_names).items():
+        weighted_groups = set()
+        empty_groups = set()
+        for mesh_obj in mesh_objects:
+            if mesh_obj.name not in group_usage:
+                vertex_indices, group_indices, weights = read_vertex_weights(mesh_obj.data)
+                weighted = np.zeros(len(mesh_obj.vertex_groups), dtype=bool)
+                weighted[group_indices[weights > 0.0]] = True
+                group_usage[mesh_obj.name] = (
+                    {vg.name for vg in mesh_obj.vertex_groups if weighted[vg.index]},
+                    {vg.name for vg in mesh_obj.vertex_groups if not weighted[vg.index]},
+                )
+            weighted_names, empty_names = group_usage[mesh_obj.name]
+            weighted_groups |= weighted_names
+            empty_groups |= empty_names
+        usage_index[armature_name] = (weighted_groups, empty_groups - weighted_groups)
+    return usage_index
 
 class ToggleBoneVisibility(bpy.types.Operator):
     bl_idname = "view3d.toggle_bone_visibility"
@@ -225,116 +695,383 @@ class DeleteUnusedVertexGroups(bpy.types.Operator):
     bl_idname = "view3d.delete_unused_vertex_groups"
     bl_label = "Delete Unused Vertex Groups"
     bl_description = "Deletes all unused vertex groups from the selected object"
+    bl_options = {'REGISTER', 'UNDO'}
 
-    def execute(self, context):
-        for ob in bpy.context.selected_objects:
-            if ob.type != 'MESH': continue
-
-            to_delete = []
-
-            for group in ob.vertex_groups:
-                if not any(v.groups and any(g.group == group.index for g in v.groups) for v in ob.data.vertices):
-                    to_delete.append(group.name)
-
-            for group_name in to_delete:
-                ob.vertex_groups.remove(ob.vertex_groups[group_name])
+    weight_threshold: bpy.props.FloatProperty(
+        name="Weight Threshold", default=0.0, min=0.0, max=1.0,
+        description="Groups whose weights are all below this value are treated as unused",
+    )
 
+    def execute(self, context):
+        removed = delete_unused_vertex_groups(bpy.context.selected_objects, self.weight_threshold)
+        if removed:
+            self.report({'INFO'}, "Removed vertex groups - " + ", ".join(f"{name}: {len(groups)}" for name, groups in removed.items()))
         return {'FINISHED'}
 
+def delete_unused_vertex_groups(objects, weight_threshold=0.0):
+    removed = {}
+    for ob in objects:
+        if ob.type != 'MESH': continue
+
+        weight_table = read_vertex_weights(ob.data)
+        unused = find_unused_vertex_groups(ob, weight_table, weight_threshold)
+        removed[ob.name] = [ob.vertex_groups[int(index)].name for index in unused]
+        remove_vertex_groups(ob, unused)
+    return removed
+
+def find_unused_vertex_groups(ob, weight_table, weight_threshold=0.0):
+    vertex_indices, group_indices, weights = weight_table
+    used = np.zeros(len(ob.vertex_groups), dtype=bool)
+    used[group_indices[weights >= weight_threshold]] = True
+    return np.flatnonzero(~used)
+
+def remove_vertex_groups(ob, indices):
+    # Highest index first, so the groups still to be removed keep their positions
+    groups = list(ob.vertex_groups)
+    for index in sorted({int(index) for index in indices}, reverse=True):
+        ob.vertex_groups.remove(groups[index])
+
 class DeleteUnusedBlendshape(bpy.types.Operator):
     bl_idname = "view3d.delete_unused_blendshape"
     bl_label = "Delete Unused Blendshape"
     bl_description = "Deletes all unused blendshapes from the selected object"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    tolerance: bpy.props.FloatProperty(
+        name="Tolerance", default=0.001, min=0.0, precision=5,
+        description="Keys whose vertices all move less than this are treated as unused",
+    )
+    protect_patterns: bpy.props.StringProperty(
+        name="Protect Patterns", default="vrc.*",
+        description="Comma separated shape key name patterns that are never deleted",
+    )
+    dry_run: bpy.props.BoolProperty(
+        name="Dry Run", default=False,
+        description="Only report the near-empty shape keys and their largest movement",
+    )
+
+    def execute(self, context):
+        removed = delete_unused_blendshapes(bpy.context.selected_objects, self.tolerance, self.protect_patterns, self.dry_run)
+        # One info-log entry per object, so the keys can be reviewed before deleting them
+        for name, keys in removed.items():
+            if keys:
+                self.report({'INFO'}, f"{name}: " + ", ".join(f"{key} ({delta:.6f})" for key, delta in keys.items()))
+        if removed:
+            prefix = "Near-empty blendshapes - " if self.dry_run else "Removed blendshapes - "
+            self.report({'INFO'}, prefix + ", ".join(f"{name}: {len(keys)}" for name, keys in removed.items()))
+        return {'FINISHED'}
+
+def delete_unused_blendshapes(objects, tolerance=0.001, protect_patterns="vrc.*", dry_run=False):
+    patterns = [pattern.strip() for pattern in protect_patterns.split(",") if pattern.strip()]
+    removed = {}
+    for ob in objects:
+        if ob.type != 'MESH': continue
+        if not ob.data.shape_keys: continue
+        if not ob.data.shape_keys.use_relative: continue
+
+        names, coords, relative = read_shape_keys(ob.data)
+        protected = [any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns) for name in names]
+        candidates = np.flatnonzero((relative != np.arange(len(names))) & ~np.array(protected, dtype=bool))
+        max_delta = measure_shape_key_deltas(coords, relative, candidates, tolerance)
+
+        near_empty = [i for i in candidates if max_delta[i] < tolerance]
+        for i in near_empty:
+            print(f"{ob.name}: {names[i]} max delta {max_delta[i]:.6f}")
+        to_delete = [names[i] for i in near_empty]
+        removed[ob.name] = {names[i]: float(max_delta[i]) for i in near_empty}
+
+        if dry_run:
+            continue
+        for kb_name in to_delete:
+            ob.shape_key_remove(ob.data.shape_keys.key_blocks[kb_name])
+    return removed
+
+# Vertices compared per step; keys that already moved past the tolerance drop out early
+SHAPE_KEY_CHUNK = 65536
+
+def read_shape_keys(mesh):
+    key_blocks = mesh.shape_keys.key_blocks
+    nverts = len(mesh.vertices)
+    names = [kb.name for kb in key_blocks]
+    coords = np.empty((len(key_blocks), nverts, 3), dtype=np.float32)
+    for i, kb in enumerate(key_blocks):
+        kb.data.foreach_get("co", coords[i].reshape(-1))
+    relative = np.array([key_blocks.find(kb.relative_key.name) for kb in key_blocks], dtype=np.int64)
+    return names, coords, relative
+
+def measure_shape_key_deltas(coords, relative, candidates, tolerance):
+    max_delta = np.zeros(len(coords), dtype=np.float32)
+    for start in range(0, coords.shape[1], SHAPE_KEY_CHUNK):
+        if not len(candidates):
+            break
+        chunk = slice(start, start + SHAPE_KEY_CHUNK)
+        deltas = np.abs(coords[candidates, chunk] - coords[relative[candidates], chunk]).max(axis=(1, 2))
+        max_delta[candidates] = np.maximum(max_delta[candidates], deltas)
+        candidates = candidates[max_delta[candidates] < tolerance]
+    return max_delta
+
+class ShapeKeySparsityReport(bpy.types.Operator):
+    bl_idname = "view3d.shape_key_sparsity_report"
+    bl_label = "Shape Key Sparsity Report"
+    bl_description = "Writes per shape key moving vertex counts and dense/sparse sizes for the selected meshes"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    threshold: bpy.props.FloatProperty(
+        name="Threshold", default=0.0001, min=0.0, precision=6,
+        description="Vertices that move less than this distance are counted as static",
+    )
+    clamp: bpy.props.BoolProperty(
+        name="Clamp Small Deltas", default=False,
+        description="Snap static vertices exactly onto their relative key so exporters store sparse blendshapes",
+    )
+    file_format: bpy.props.EnumProperty(
+        name="Format",
+        items=[('CSV', "CSV", ""), ('JSON', "JSON", "")],
+        default='CSV',
+    )
 
     def execute(self, context):
-        tolerance = 0.001
+        output_dir = bpy.path.abspath("//") if bpy.data.filepath else bpy.app.tempdir
+        written = []
+        not_clamped = []
+        failed = []
         for ob in bpy.context.selected_objects:
             if ob.type != 'MESH': continue
             if not ob.data.shape_keys: continue
-            if not ob.data.shape_keys.use_relative: continue
-
-            kbs = ob.data.shape_keys.key_blocks
-            nverts = len(ob.data.vertices)
-            to_delete = []
-
-            cache = {}
-            locs = np.empty(3*nverts, dtype=np.float32)
-
-            for kb in kbs:
-                if kb.name == "Basis": continue  # Skip Basis
-
-                kb.data.foreach_get("co", locs)
-
-                if kb.relative_key.name not in cache:
-                    rel_locs = np.empty(3*nverts, dtype=np.float32)
-                    kb.relative_key.data.foreach_get("co", rel_locs)
-                    cache[kb.relative_key.name] = rel_locs
-                rel_locs = cache[kb.relative_key.name]
-
-                locs -= rel_locs
-                if (np.abs(locs) < tolerance).all():
-                    to_delete.append(kb.name)
-
-            for kb_name in to_delete:
-                ob.shape_key_remove(ob.data.shape_keys.key_blocks[kb_name])
 
+            # Absolute keys have no meaningful relative key to snap onto
+            clamp = self.clamp and ob.data.shape_keys.use_relative
+            if self.clamp and not clamp:
+                not_clamped.append(ob.name)
+
+            names, coords, relative = read_shape_keys(ob.data)
+            clamped = False
+            rows = []
+            # Dense keys store a float3 per vertex; sparse ones an int index plus a float3 per moving vertex
+            for i, name in enumerate(names):
+                if relative[i] == i:
+                    continue
+                moving = np.linalg.norm(coords[i] - coords[relative[i]], axis=1) > self.threshold
+                moving_count = int(moving.sum())
+                rows.append({
+                    "name": name,
+                    "moving_vertices": moving_count,
+                    "dense_bytes": coords.shape[1] * 12,
+                    "sparse_bytes": moving_count * 16,
+                })
+
+                if clamp and moving_count < coords.shape[1]:
+                    coords[i, ~moving] = coords[relative[i], ~moving]
+                    ob.data.shape_keys.key_blocks[i].data.foreach_set("co", coords[i].reshape(-1))
+                    clamped = True
+
+            if clamped:
+                ob.data.update()
+
+            path = os.path.join(output_dir, f"{bpy.path.clean_name(ob.name)}_shapekeys.{self.file_format.lower()}")
+            try:
+                write_sparsity_report(path, ob.name, coords.shape[1], self.threshold, rows)
+            except OSError as e:
+                failed.append(f"{path}: {e}")
+                continue
+            written.append(path)
+
+        if not_clamped:
+            self.report({'WARNING'}, "Absolute shape keys not clamped - " + ", ".join(not_clamped))
+        if failed:
+            self.report({'ERROR'}, "Could not write report - " + ", ".join(failed))
+        if written:
+            self.report({'INFO'}, "Report written to " + ", ".join(written))
         return {'FINISHED'}
 
-def straighten_uv():
-    obj = bpy.context.active_object
-    if obj and obj.type == 'MESH':
-        bpy.ops.object.mode_set(mode='EDIT')
-        bm = bmesh.from_edit_mesh(obj.data)
-        uv_layer = bm.loops.layers.uv.active
-
-        if not uv_layer:
-            print("No active UV layer found")
-            return
-
-        selected_uv_coords = []
-        selected_uv_loops = []
-
-        for face in bm.faces:
-            for loop in face.loops:
-                if loop[uv_layer].select:
-                    selected_uv_coords.append(loop[uv_layer].uv.copy())
-                    selected_uv_loops.append(loop)
-
-        unique_selected_uv_coords = np.unique(np.array(selected_uv_coords), axis=0)
-
-        if len(unique_selected_uv_coords) != 4:
-            print("Number of unique selected UV vertices is not 4:", len(unique_selected_uv_coords))
-            return
-
-        min_x, min_y = np.min(unique_selected_uv_coords, axis=0)
-        max_x, max_y = np.max(unique_selected_uv_coords, axis=0)
-
-        aligned_uv = np.array([
-            [min_x, min_y],
-            [min_x, max_y],
-            [max_x, max_y],
-            [max_x, min_y]
-        ])
-
-        for loop in selected_uv_loops:
-            closest_aligned_uv = aligned_uv[np.argmin(np.linalg.norm(aligned_uv - loop[uv_layer].uv, axis=1))]
-            loop[uv_layer].uv = closest_aligned_uv
+def write_sparsity_report(path, object_name, nverts, threshold, rows):
+    if path.endswith(".json"):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "object": object_name,
+                "vertices": nverts,
+                "threshold": threshold,
+                "dense_bytes": sum(row["dense_bytes"] for row in rows),
+                "sparse_bytes": sum(row["sparse_bytes"] for row in rows),
+                "keys": rows,
+            }, f, indent=2)
+        return
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["name", "moving_vertices", "dense_bytes", "sparse_bytes"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+def snap_to_quad(mesh, uvs, selected):
+    selected_uvs = uvs[selected]
+    unique_selected_uv_coords = np.unique(selected_uvs, axis=0)
+
+    if len(unique_selected_uv_coords) != 4:
+        print("Number of unique selected UV vertices is not 4:", len(unique_selected_uv_coords))
+        return False
 
-        bmesh.update_edit_mesh(obj.data)
-        print("UV straightened")
+    min_x, min_y = np.min(unique_selected_uv_coords, axis=0)
+    max_x, max_y = np.max(unique_selected_uv_coords, axis=0)
+
+    aligned_uv = np.array([
+        [min_x, min_y],
+        [min_x, max_y],
+        [max_x, max_y],
+        [max_x, min_y]
+    ], dtype=np.float32)
+
+    distances = ((selected_uvs[:, None, :] - aligned_uv[None, :, :]) ** 2).sum(axis=2)
+    uvs[selected] = aligned_uv[np.argmin(distances, axis=1)]
+    return True
+
+def find_uv_islands(uvs, loop_vertices, next_loops):
+    """Merges loops sharing a vertex and UV into UV vertices and labels the islands their edges connect.
+
+    next_loops links each loop to the next loop of its polygon, or to itself when that edge is not part of the island.
+    """
+    keys = np.column_stack([loop_vertices.astype(np.float64), uvs.astype(np.float64)])
+    uv_vertices, loop_nodes = np.unique(keys, axis=0, return_inverse=True)
+    loop_nodes = loop_nodes.reshape(-1)
+    edge_a = loop_nodes
+    edge_b = loop_nodes[next_loops]
+
+    # Hook roots onto the smaller neighbouring root, then jump pointers until every node points at its root
+    labels = np.arange(len(uv_vertices))
+    while True:
+        root_a = labels[edge_a]
+        root_b = labels[edge_b]
+        if np.array_equal(root_a, root_b):
+            break
+        np.minimum.at(labels, root_a, root_b)
+        np.minimum.at(labels, root_b, root_a)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+
+    _, islands = np.unique(labels, return_inverse=True)
+    return uv_vertices[:, 1:], loop_nodes, islands.reshape(-1)
+
+def straighten_uv_islands(uvs, selected, loop_vertices, loop_starts, loop_totals):
+    """Snaps every selected UV island onto its bounding rectangle and returns the number of islands."""
+    selected_loops = np.flatnonzero(selected)
+    if not len(selected_loops):
+        return 0
+
+    # Only polygon edges between two selected loops connect an island
+    next_loops = np.arange(1, len(uvs) + 1)
+    next_loops[loop_starts + loop_totals - 1] = loop_starts
+    local_index = np.full(len(uvs), -1, dtype=np.int64)
+    local_index[selected_loops] = np.arange(len(selected_loops))
+    local_next = local_index[next_loops[selected_loops]]
+    local_next = np.where(local_next >= 0, local_next, np.arange(len(selected_loops)))
+
+    nodes, loop_nodes, islands = find_uv_islands(uvs[selected_loops], loop_vertices[selected_loops], local_next)
+    nislands = islands.max() + 1
+
+    # Boundary UV vertices lie on an edge used by a single selected face; only they are moved
+    linked = local_next != np.arange(len(selected_loops))
+    edge_a = loop_nodes[linked]
+    edge_b = loop_nodes[local_next[linked]]
+    edge_keys = np.minimum(edge_a, edge_b) * len(nodes) + np.maximum(edge_a, edge_b)
+    edge_keys, edge_uses = np.unique(edge_keys[edge_a != edge_b], return_counts=True)
+    boundary_edges = edge_keys[edge_uses == 1]
+    boundary = np.zeros(len(nodes), dtype=bool)
+    boundary[boundary_edges // len(nodes)] = True
+    boundary[boundary_edges % len(nodes)] = True
+
+    low = np.full((nislands, 2), np.inf)
+    high = np.full((nislands, 2), -np.inf)
+    np.minimum.at(low, islands, nodes)
+    np.maximum.at(high, islands, nodes)
+    node_low = low[islands]
+    node_high = high[islands]
+
+    # Boundary points move onto the nearest side of their island's rectangle, which keeps their spacing along it
+    side_distances = np.column_stack([
+        nodes[:, 0] - node_low[:, 0],
+        node_high[:, 0] - nodes[:, 0],
+        nodes[:, 1] - node_low[:, 1],
+        node_high[:, 1] - nodes[:, 1],
+    ])
+    nearest_side = np.argmin(side_distances, axis=1)
+    straightened = nodes.copy()
+    sides = np.column_stack([node_low[:, 0], node_high[:, 0], node_low[:, 1], node_high[:, 1]])
+    side_values = sides[np.arange(len(nodes)), nearest_side]
+    straightened[:, 0] = np.where(boundary & (nearest_side < 2), side_values, straightened[:, 0])
+    straightened[:, 1] = np.where(boundary & (nearest_side >= 2), side_values, straightened[:, 1])
+
+    # The boundary point closest to each corner of its island becomes that corner
+    boundary_nodes = np.flatnonzero(boundary)
+    boundary_islands = islands[boundary_nodes]
+    for corner_x, corner_y in ((node_low[:, 0], node_low[:, 1]), (node_low[:, 0], node_high[:, 1]),
+                               (node_high[:, 0], node_high[:, 1]), (node_high[:, 0], node_low[:, 1])):
+        distances = (nodes[boundary_nodes, 0] - corner_x[boundary_nodes]) ** 2 + (nodes[boundary_nodes, 1] - corner_y[boundary_nodes]) ** 2
+        order = np.lexsort((distances, boundary_islands))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = boundary_islands[order[1:]] != boundary_islands[order[:-1]]
+        corner_nodes = boundary_nodes[order[first]]
+        straightened[corner_nodes, 0] = corner_x[corner_nodes]
+        straightened[corner_nodes, 1] = corner_y[corner_nodes]
+
+    uvs[selected_loops] = straightened[loop_nodes]
+    return nislands
+
+def snap_to_islands(mesh, uvs, selected):
+    loop_vertices = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loop_vertices)
+    npolys = len(mesh.polygons)
+    loop_starts = np.empty(npolys, dtype=np.int64)
+    loop_totals = np.empty(npolys, dtype=np.int64)
+    mesh.polygons.foreach_get("loop_start", loop_starts)
+    mesh.polygons.foreach_get("loop_total", loop_totals)
+    nislands = straighten_uv_islands(uvs, selected, loop_vertices, loop_starts, loop_totals)
+    print("UV islands straightened:", nislands)
+    return nislands > 0
+
+def straighten_uv(context=None, all_uv_maps=False, mode='QUAD'):
+    context = context or bpy.context
+    snap = snap_to_islands if mode == 'ISLANDS' else snap_to_quad
+    changed_maps = edit_uv_maps(context, snap, all_uv_maps)
+    print("UV straightened:", changed_maps, "UV map(s)")
+    return changed_maps
 
 class StraightenUVOperator(bpy.types.Operator):
     bl_idname = "uv.straighten_uv_operator"
     bl_label = "Straighten UVs"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    mode: bpy.props.EnumProperty(
+        name="Mode",
+        items=[
+            ('QUAD', "Quad", "Snap exactly 4 selected UVs to their bounding rectangle"),
+            ('ISLANDS', "Islands", "Snap every connected selected UV island to its own bounding rectangle"),
+        ],
+        default='QUAD',
+    )
+    all_uv_maps: bpy.props.BoolProperty(name="All UV Maps", default=False, description="Edit every UV map instead of only the active one")
 
     def execute(self, context):
-        straighten_uv()
+        straighten_uv(context, self.all_uv_maps, self.mode)
         return {'FINISHED'}
 
 class RemoveShapeKeyInfluence(bpy.types.Operator):
     bl_idname = "view3d.remove_shapekey_influence"
     bl_label = "Remove Shapekey Influence"
     bl_description = "Removes the influence of the active shapekey from selected vertices"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    factor: bpy.props.FloatProperty(name="Factor", default=1.0, min=0.0, max=1.0)
+    vertex_group: bpy.props.StringProperty(name="Vertex Group", description="Scale the removal by this vertex group's weights")
+    key_scope: bpy.props.EnumProperty(
+        name="Shape Keys",
+        items=[
+            ('ACTIVE', "Active", "Only the active shape key"),
+            ('ALL', "All", "Every shape key except the basis"),
+        ],
+        default='ACTIVE',
+    )
 
     def execute(self, context):
         obj = bpy.context.object
@@ -346,28 +1083,61 @@ class RemoveShapeKeyInfluence(bpy.types.Operator):
         
         active_key_index = obj.active_shape_key_index
         
-        if active_key_index > 0:
-            active_key = mesh.shape_keys.key_blocks[active_key_index]
-            
-            bpy.ops.object.mode_set(mode='OBJECT')
-            
-            for vert in mesh.vertices:
-                if vert.select:
-                    active_key.data[vert.index].co = mesh.vertices[vert.index].co
-            
-            bpy.ops.object.mode_set(mode='EDIT')
-            
-            return {'FINISHED'}
-        else:
+        if self.key_scope == 'ACTIVE' and active_key_index <= 0:
             self.report({'WARNING'}, "No active shape key selected.")
             return {'CANCELLED'}
 
+        vertex_group = obj.vertex_groups.get(self.vertex_group) if self.vertex_group else None
+        if self.vertex_group and not vertex_group:
+            self.report({'WARNING'}, f"Vertex group '{self.vertex_group}' not found.")
+            return {'CANCELLED'}
+
+        # Edit-mode changes have to be flushed to the mesh before its arrays can be read
+        in_edit_mode = obj.mode == 'EDIT'
+        if in_edit_mode:
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        nverts = len(mesh.vertices)
+        selected = np.zeros(nverts, dtype=bool)
+        mesh.vertices.foreach_get("select", selected)
+        influence = selected * np.float32(self.factor)
+
+        if vertex_group:
+            # Only the selected vertices need their weight; vertices outside the group raise RuntimeError
+            group_weights = np.zeros(nverts, dtype=np.float32)
+            for index in np.flatnonzero(selected).tolist():
+                try:
+                    group_weights[index] = vertex_group.weight(index)
+                except RuntimeError:
+                    pass
+            influence *= group_weights
+
+        base = np.empty(nverts * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", base)
+        base = base.reshape(nverts, 3)
+
+        key_blocks = mesh.shape_keys.key_blocks
+        keys = [key_blocks[active_key_index]] if self.key_scope == 'ACTIVE' else list(key_blocks)[1:]
+        influence = influence[:, None]
+        coords = np.empty((nverts, 3), dtype=np.float32)
+        for key_block in keys:
+            key_block.data.foreach_get("co", coords.reshape(-1))
+            result = coords * (1.0 - influence) + base * influence
+            key_block.data.foreach_set("co", result.reshape(-1))
+
+        mesh.update()
+        if in_edit_mode:
+            bpy.ops.object.mode_set(mode='EDIT')
+
+        return {'FINISHED'}
+
 
 def register():
     bpy.utils.register_class(BoneManager)
     bpy.utils.register_class(DeleteUVVerticesOperator)
     bpy.utils.register_class(ToggleBoneVisibility)
     bpy.utils.register_class(DeleteUnusedBlendshape)
+    bpy.utils.register_class(ShapeKeySparsityReport)
     bpy.utils.register_class(DeleteUnusedVertexGroups)
     bpy.utils.register_class(StraightenUVOperator)
     bpy.utils.register_class(UVToolPanel)
@@ -379,6 +1149,9 @@ def register():
     bpy.utils.register_class(RemoveShapeKeyInfluence)
     bpy.utils.register_class(SmoothWeights3D)
     bpy.utils.register_class(MakeSingleUser)
+    bpy.utils.register_class(RefreshStatistics)
+    bpy.app.handlers.depsgraph_update_post.append(statistics_depsgraph_handler)
+    bpy.app.handlers.load_post.append(statistics_load_handler)
     
 
 def unregister():
@@ -386,11 +1159,18 @@ def unregister():
     bpy.utils.unregister_class(DeleteUVVerticesOperator)
     bpy.utils.unregister_class(ToggleBoneVisibility)
     bpy.utils.unregister_class(DeleteUnusedBlendshape)
+    bpy.utils.unregister_class(ShapeKeySparsityReport)
     bpy.utils.unregister_class(DeleteUnusedVertexGroups)
     bpy.utils.unregister_class(DeleteUnusedBones)
     bpy.utils.unregister_class(RemoveShapeKeyInfluence)
     bpy.utils.unregister_class(SmoothWeights3D)
     bpy.utils.unregister_class(MakeSingleUser)
+    bpy.utils.unregister_class(RefreshStatistics)
+    if statistics_depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(statistics_depsgraph_handler)
+    if statistics_load_handler in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(statistics_load_handler)
+    invalidate_statistics()
     bpy.utils.unregister_class(StraightenUVOperator)
     bpy.utils.unregister_class(UVToolPanel)
 
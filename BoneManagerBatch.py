@@ -0,0 +1,174 @@
+"""Runs Bone Manager playbooks on .blend files without the UI.
+
+    blender --background --python BoneManagerBatch.py -- --playbook playbook.json --jobs 4 --report report.json a.blend b.blend
+
+Every file is opened by its own Blender worker process, so files are cleaned in parallel.
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Workers print their result on a line starting with this marker
+RESULT_MARKER = "BM_BATCH_RESULT "
+
+PLAYBOOK_ACTIONS = (
+    "delete_unused_blendshape",
+    "delete_unused_vertex_groups",
+    "delete_unused_bones",
+    "make_single_user",
+)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="BoneManagerBatch", description="Run Bone Manager playbooks on .blend files")
+    parser.add_argument("files", nargs="*", help=".blend files to process")
+    parser.add_argument("--playbook", required=True, help="JSON playbook spec")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Number of Blender workers")
+    parser.add_argument("--report", help="Write the JSON report here instead of printing it")
+    parser.add_argument("--blender", help="Blender executable for the workers (defaults to the running Blender)")
+    parser.add_argument("--timeout", type=float, default=None, help="Seconds before a worker is stopped")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def script_args():
+    # Blender keeps its own arguments in sys.argv, ours follow "--"
+    if "--" in sys.argv:
+        return sys.argv[sys.argv.index("--") + 1:]
+    return sys.argv[1:]
+
+def load_playbook(path):
+    with open(path, encoding="utf-8") as f:
+        playbook = json.load(f)
+    for step in playbook.get("steps", []):
+        if step.get("action") not in PLAYBOOK_ACTIONS:
+            raise ValueError(f"Unknown playbook action: {step.get('action')}")
+    return playbook
+
+def blender_executable(args):
+    if args.blender:
+        return args.blender
+    try:
+        import bpy
+        return bpy.app.binary_path
+    except ImportError:
+        return "blender"
+
+def run_worker_process(blender, blend_path, playbook_path, timeout):
+    command = [
+        blender, "--background", "--factory-startup", blend_path,
+        "--python", os.path.abspath(__file__), "--",
+        "--worker", "--playbook", playbook_path,
+    ]
+    start = time.perf_counter()
+    result = {"file": blend_path}
+    try:
+        process = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        result.update(ok=False, error=f"Timed out after {timeout} seconds")
+    except OSError as e:
+        result.update(ok=False, error=str(e))
+    else:
+        lines = [line for line in process.stdout.splitlines() if line.startswith(RESULT_MARKER)]
+        if lines:
+            result.update(json.loads(lines[-1][len(RESULT_MARKER):]))
+        else:
+            result.update(ok=False, error=f"Worker exited with code {process.returncode}: {process.stderr.strip()[-2000:]}")
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+def run_batch(args):
+    playbook_path = os.path.abspath(args.playbook)
+    try:
+        load_playbook(playbook_path)
+    except (OSError, ValueError) as e:
+        print(f"BM Batch: {e}", file=sys.stderr)
+        return 2
+    blender = blender_executable(args)
+    files = [os.path.abspath(path) for path in args.files]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        results = list(pool.map(lambda path: run_worker_process(blender, path, playbook_path, args.timeout), files))
+
+    report = {
+        "playbook": playbook_path,
+        "seconds": round(time.perf_counter() - start, 3),
+        "files": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"BM Batch: {sum(r.get('ok', False) for r in results)}/{len(results)} files done, report written to {args.report}")
+    else:
+        print(text)
+    return 0 if all(r.get("ok") for r in results) else 1
+
+def select_objects(objects, patterns):
+    if not patterns:
+        return list(objects)
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    return [ob for ob in objects if any(fnmatch.fnmatchcase(ob.name, pattern) for pattern in patterns)]
+
+def run_step(bpy, BoneManager, step, objects):
+    options = {key: value for key, value in step.items() if key not in ("action", "objects")}
+    action = step["action"]
+    if action == "delete_unused_blendshape":
+        return BoneManager.delete_unused_blendshapes(objects, **options)
+    if action == "delete_unused_vertex_groups":
+        return BoneManager.delete_unused_vertex_groups(objects, **options)
+    if action == "delete_unused_bones":
+        return BoneManager.delete_unused_bones(bpy.context, objects, **options)
+    if action == "make_single_user":
+        return BoneManager.make_single_user(bpy.context, objects, **options)
+
+def run_playbook(playbook_path):
+    import bpy
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import BoneManager
+
+    playbook = load_playbook(playbook_path)
+    steps = []
+    for step in playbook.get("steps", []):
+        start = time.perf_counter()
+        objects = select_objects(bpy.context.view_layer.objects, step.get("objects", playbook.get("objects")))
+        changes = run_step(bpy, BoneManager, step, objects)
+        steps.append({
+            "action": step["action"],
+            "seconds": round(time.perf_counter() - start, 3),
+            "changes": changes,
+        })
+
+    saved_to = None
+    if playbook.get("output_dir"):
+        os.makedirs(playbook["output_dir"], exist_ok=True)
+        saved_to = os.path.join(playbook["output_dir"], os.path.basename(bpy.data.filepath))
+        bpy.ops.wm.save_as_mainfile(filepath=saved_to, copy=True)
+    elif playbook.get("save"):
+        bpy.ops.wm.save_mainfile()
+        saved_to = bpy.data.filepath
+    return {"steps": steps, "saved_to": saved_to}
+
+def run_worker(args):
+    start = time.perf_counter()
+    try:
+        result = run_playbook(os.path.abspath(args.playbook))
+        result["ok"] = True
+    except Exception as e:
+        result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    result["worker_seconds"] = round(time.perf_counter() - start, 3)
+    print(RESULT_MARKER + json.dumps(result), flush=True)
+    return 0 if result["ok"] else 1
+
+def main():
+    args = parse_args(script_args())
+    return run_worker(args) if args.worker else run_batch(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,19 +9,37 @@ bl_info = {
 }
 
 import bpy
-from mathutils import Vector
+from bpy.app.handlers import persistent
+import functools
+import hashlib
+import io
+import os
+import queue
+import threading
+import numpy as np
+from mathutils import kdtree
 
 disable_update = False
 
-class STT_OriginalPosition(bpy.types.PropertyGroup):
-    x: bpy.props.FloatProperty()
-    y: bpy.props.FloatProperty()
-    z: bpy.props.FloatProperty()
-
-class STT_OriginalShapeKey(bpy.types.PropertyGroup):
-    name: bpy.props.StringProperty()
-    values: bpy.props.CollectionProperty(type=STT_OriginalPosition)
-    value: bpy.props.FloatProperty()
+# Снимки исходного состояния целевых объектов: имя объекта -> снимок
+stt_snapshots = {}
+# ID-свойство объекта, в котором снимок может храниться внутри .blend
+STT_SNAPSHOT_PROP = "stt_snapshot"
+# Ключи, уже перенесённые на цель в режиме превью
+stt_applied_keys = set()
+# Последняя использованная привязка: (хеш, привязка)
+stt_last_binding = (None, None)
+
+# Вес вершины источника 1/d учитывается только при weight > 0.1, т.е. d < 10
+STT_MAX_DISTANCE = 10.0
+# Ограничение на размер промежуточного массива (nnz x ключи x 3) при умножении
+STT_BATCH_ELEMENTS = 1 << 24
+# Сколько привязок хранить в кеше на диске, самые старые по использованию удаляются
+STT_CACHE_MAX_FILES = 32
+# Сколько готовых ключей фоновый перенос записывает в меш за один тик таймера
+STT_KEYS_PER_TICK = 8
+# Через сколько вершин построение привязки проверяет отмену и сообщает прогресс
+STT_BINDING_CHECK_VERTICES = 4096
 
 class STT_ShapekeyItem(bpy.types.PropertyGroup):
     stt_name: bpy.props.StringProperty(name="Name")
@@ -31,17 +49,50 @@ class STT_ShapekeyTransferProperties(bpy.types.PropertyGroup):
     stt_source_object: bpy.props.PointerProperty(name="Source Object", type=bpy.types.Object, update=lambda self, context: stt_update_shapekeys_list(self, context))
     stt_target_object: bpy.props.PointerProperty(name="Target Object", type=bpy.types.Object)
     stt_all_shapekeys: bpy.props.BoolProperty(name="All Shapekeys", default=True, update=lambda self, context: stt_recalculate_shapekeys(self, context))
+    stt_neighbor_count: bpy.props.IntProperty(name="Neighbors", default=16, min=1, max=256, description="Number of nearest source vertices blended into each target vertex")
+    stt_use_cache: bpy.props.BoolProperty(name="Cache Binding", default=True, description="Reuse neighbor bindings stored on disk when the basis geometry has not changed")
     stt_selected_shapekeys: bpy.props.CollectionProperty(type=STT_ShapekeyItem)
     stt_preview: bpy.props.BoolProperty(name="Preview", default=False, update=lambda self, context: stt_update_preview(self, context))
     stt_update_trigger: bpy.props.BoolProperty(name="Update Trigger", default=False, update=lambda self, context: stt_update_shapekeys_list(self, context))
-
-    stt_original_positions: bpy.props.CollectionProperty(type=STT_OriginalPosition)
-    stt_original_shapekeys: bpy.props.CollectionProperty(type=STT_OriginalShapeKey)
+    stt_persist_snapshot: bpy.props.BoolProperty(name="Store Snapshot in File", default=False, description="Keep the preview snapshot in the target object, so the preview stays on after reloading the file and can still be reverted")
 
     def stt_update_selected_shapekeys(self):
         print("Updating selected shapekeys")
         self.stt_update_trigger = not self.stt_update_trigger
 
+def stt_serialize_snapshot(snapshot):
+    """Упаковывает снимок в один блок байтов"""
+    buffer = io.BytesIO()
+    np.savez(buffer, vertices=snapshot["vertices"], keys=snapshot["keys"],
+             values=snapshot["values"], names=np.array(snapshot["names"], dtype=str))
+    return buffer.getvalue()
+
+def stt_deserialize_snapshot(blob):
+    """Распаковывает снимок из блока байтов"""
+    with np.load(io.BytesIO(blob)) as data:
+        return {
+            "vertices": data["vertices"],
+            "keys": data["keys"],
+            "values": data["values"],
+            "names": data["names"].tolist(),
+        }
+
+def stt_get_snapshot(target_obj):
+    """Возвращает снимок объекта из памяти или из ID-свойства"""
+    snapshot = stt_snapshots.get(target_obj.name)
+    if snapshot is None and STT_SNAPSHOT_PROP in target_obj:
+        snapshot = stt_deserialize_snapshot(bytes(target_obj[STT_SNAPSHOT_PROP]))
+        stt_snapshots[target_obj.name] = snapshot
+    return snapshot
+
+def stt_clear_snapshot(target_obj):
+    """Забывает снимок объекта"""
+    if not target_obj:
+        return
+    stt_snapshots.pop(target_obj.name, None)
+    if STT_SNAPSHOT_PROP in target_obj:
+        del target_obj[STT_SNAPSHOT_PROP]
+
 def stt_save_original_state(target_obj):
     """Сохраняем оригинальное состояние целевого объекта"""
     print("Saving original state")
@@ -51,36 +102,34 @@ def stt_save_original_state(target_obj):
         print("No target object or not a mesh")
         return
 
-    shape_keys = target_obj.data.shape_keys
-    if not shape_keys:
-        print("No shape keys found")
-        return
-
-    props.stt_original_positions.clear()
-    props.stt_original_shapekeys.clear()
-
-    for vert in target_obj.data.vertices:
-        pos = props.stt_original_positions.add()
-        pos.x = vert.co.x
-        pos.y = vert.co.y
-        pos.z = vert.co.z
-
-    for key_block in shape_keys.key_blocks:
-        shape_key_item = props.stt_original_shapekeys.add()
-        shape_key_item.name = key_block.name
-        shape_key_item.value = key_block.value
-        for v in key_block.data:
-            pos = shape_key_item.values.add()
-            pos.x = v.co.x
-            pos.y = v.co.y
-            pos.z = v.co.z
+    # Снимок из файла остался от превью, которое не было выключено: сначала возвращаем цель к нему
+    if STT_SNAPSHOT_PROP in target_obj:
+        stt_restore_original_state(target_obj)
+
+    mesh = target_obj.data
+    count = len(mesh.vertices)
+    key_blocks = mesh.shape_keys.key_blocks if mesh.shape_keys else []
+
+    keys = np.empty((len(key_blocks), count, 3), dtype=np.float32)
+    for i, key_block in enumerate(key_blocks):
+        keys[i] = stt_read_coords(key_block.data, count)
+
+    snapshot = {
+        "vertices": stt_read_coords(mesh.vertices, count),
+        "keys": keys,
+        "values": np.array([key_block.value for key_block in key_blocks], dtype=np.float32),
+        "names": [key_block.name for key_block in key_blocks],
+    }
+    stt_clear_snapshot(target_obj)
+    stt_snapshots[target_obj.name] = snapshot
+    if props.stt_persist_snapshot:
+        target_obj[STT_SNAPSHOT_PROP] = stt_serialize_snapshot(snapshot)
 
     print("Original state saved")
 
 def stt_restore_original_state(target_obj):
     """Восстанавливаем оригинальное состояние целевого объекта"""
     global disable_update
-    props = bpy.context.scene.stt_shapekey_transfer_props
 
     if disable_update:
         print("Update is disabled, skipping restoration")
@@ -92,26 +141,172 @@ def stt_restore_original_state(target_obj):
         print("No target object or not a mesh")
         return
 
-    shape_keys = target_obj.data.shape_keys
-
-    if shape_keys:
-        key_blocks = list(shape_keys.key_blocks)
-        for key_block in key_blocks:
-            target_obj.shape_key_remove(key_block)
+    snapshot = stt_get_snapshot(target_obj)
+    if snapshot is None:
+        print("No saved state found")
+        return
 
-    for shape_key_item in props.stt_original_shapekeys:
-        new_key = target_obj.shape_key_add(name=shape_key_item.name)
-        new_key.value = shape_key_item.value
-        for i, vert in enumerate(new_key.data):
-            orig_pos = shape_key_item.values[i]
-            vert.co = Vector((orig_pos.x, orig_pos.y, orig_pos.z))
+    mesh = target_obj.data
+    if len(snapshot["vertices"]) != len(mesh.vertices):
+        print("Saved state does not match the vertex count of the target")
+        return
+    names = snapshot["names"]
 
-    for i, vert in enumerate(target_obj.data.vertices):
-        orig_pos = props.stt_original_positions[i]
-        vert.co = Vector((orig_pos.x, orig_pos.y, orig_pos.z))
+    if not names:
+        target_obj.shape_key_clear()
+    else:
+        # Удаляем только ключи, добавленные переносом
+        if mesh.shape_keys:
+            kept = set(names)
+            for key_block in list(mesh.shape_keys.key_blocks):
+                if key_block.name not in kept:
+                    target_obj.shape_key_remove(key_block)
+
+        # Пересоздаём ключи, только если их состав или порядок изменился
+        current = [key_block.name for key_block in mesh.shape_keys.key_blocks] if mesh.shape_keys else []
+        if current != names:
+            target_obj.shape_key_clear()
+            for name in names:
+                target_obj.shape_key_add(name=name, from_mix=False)
+
+        for key_block, coords, value in zip(mesh.shape_keys.key_blocks, snapshot["keys"], snapshot["values"]):
+            key_block.data.foreach_set("co", coords.ravel())
+            key_block.value = value
+
+    mesh.vertices.foreach_set("co", snapshot["vertices"].ravel())
+    mesh.update()
+    stt_applied_keys.clear()
 
     print("Original state restored")
 
+def stt_read_coords(data, count):
+    """Читает координаты вершин или shape key одним вызовом foreach_get"""
+    coords = np.empty(count * 3, dtype=np.float32)
+    data.foreach_get("co", coords)
+    return coords.reshape(count, 3)
+
+def stt_build_binding(source_co, target_co, neighbor_count, max_distance=STT_MAX_DISTANCE, cancel_event=None, progress=None):
+    """Находит k ближайших вершин источника для каждой вершины цели и их нормированные веса 1/d"""
+    # Отмена (тогда возвращается None) и прогресс по вершинам источника и цели проверяются пачками
+    total = len(source_co) + len(target_co)
+    kd = kdtree.KDTree(len(source_co))
+    for i, co in enumerate(source_co.tolist()):
+        if i % STT_BINDING_CHECK_VERTICES == 0:
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            if progress:
+                progress(i, total)
+        kd.insert(co, i)
+    kd.balance()
+
+    k = max(1, min(neighbor_count, len(source_co)))
+    indices = np.zeros((len(target_co), k), dtype=np.int32)
+    weights = np.zeros((len(target_co), k), dtype=np.float32)
+
+    for i, co in enumerate(target_co.tolist()):
+        if i % STT_BINDING_CHECK_VERTICES == 0:
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            if progress:
+                progress(len(source_co) + i, total)
+        for j, (_, index, distance) in enumerate(kd.find_n(co, k)):
+            if distance >= max_distance:
+                break
+            indices[i, j] = index
+            weights[i, j] = 1.0 / max(distance, 1e-6)
+
+    totals = weights.sum(axis=1)
+    valid = totals > 0.0
+    weights[valid] /= totals[valid, None]
+
+    # Упаковываем в CSR: indptr (N_target + 1), indices и weights длиной nnz
+    mask = weights > 0.0
+    indptr = np.zeros(len(target_co) + 1, dtype=np.int64)
+    np.cumsum(mask.sum(axis=1), out=indptr[1:])
+    return indptr, indices[mask], weights[mask]
+
+def stt_binding_valid(binding):
+    """Маска вершин цели, у которых есть хотя бы один сосед в источнике"""
+    return np.diff(binding[0]) > 0
+
+def stt_transfer_deltas(binding, source_deltas):
+    """Умножает разреженную матрицу весов на смещения источника (N_source x ...) для всех ключей сразу"""
+    indptr, indices, weights = binding
+    result = np.zeros((len(indptr) - 1,) + source_deltas.shape[1:], dtype=np.float32)
+    rows = stt_binding_valid(binding)
+    if rows.any():
+        products = source_deltas[indices] * weights.reshape((-1,) + (1,) * (source_deltas.ndim - 1))
+        result[rows] = np.add.reduceat(products, indptr[:-1][rows], axis=0)
+    return result
+
+def stt_cache_dir():
+    """Папка пользовательского кеша привязок"""
+    return bpy.utils.user_resource('DATAFILES', path="stt_cache", create=True)
+
+def stt_binding_hash(source_co, target_co, neighbor_count, max_distance):
+    """Хеш базисов источника и цели вместе с параметрами привязки"""
+    digest = hashlib.sha1()
+    digest.update(np.array([len(source_co), len(target_co), neighbor_count, max_distance], dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(source_co, dtype=np.float32).tobytes())
+    digest.update(np.ascontiguousarray(target_co, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+def stt_load_cached_binding(path):
+    """Загружает привязку из .npz, при ошибке возвращает None"""
+    try:
+        with np.load(path) as data:
+            binding = (data["indptr"], data["indices"], data["weights"])
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Failed to load cached binding {path}: {e}")
+        return None
+    os.utime(path)
+    return binding
+
+def stt_store_cached_binding(path, binding):
+    """Сохраняет привязку в .npz и удаляет самые давно использованные файлы кеша"""
+    indptr, indices, weights = binding
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            np.savez(f, indptr=indptr, indices=indices, weights=weights)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Failed to store cached binding {path}: {e}")
+        return
+
+    cache_dir = os.path.dirname(path)
+    files = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith(".npz")]
+    files.sort(key=os.path.getmtime, reverse=True)
+    for old_path in files[STT_CACHE_MAX_FILES:]:
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+
+def stt_get_binding(source_co, target_co, neighbor_count, cache_dir=None, max_distance=STT_MAX_DISTANCE, cancel_event=None, progress=None):
+    """Возвращает привязку из памяти, из кеша на диске (если задан cache_dir) или строит новую; None при отмене"""
+    global stt_last_binding
+    binding_hash = stt_binding_hash(source_co, target_co, neighbor_count, max_distance)
+    if stt_last_binding[0] == binding_hash:
+        return stt_last_binding[1]
+
+    binding = None
+    path = os.path.join(cache_dir, binding_hash + ".npz") if cache_dir else None
+    if path and os.path.exists(path):
+        binding = stt_load_cached_binding(path)
+        if binding is not None:
+            print("Using cached binding")
+
+    if binding is None:
+        binding = stt_build_binding(source_co, target_co, neighbor_count, max_distance, cancel_event, progress)
+        if binding is None:
+            return None
+        if path:
+            stt_store_cached_binding(path, binding)
+
+    stt_last_binding = (binding_hash, binding)
+    return binding
+
 def stt_update_shapekeys_list(self, context):
     """Обновляет список блендшейпов"""
     print("Updating shapekeys list")
@@ -126,24 +321,133 @@ def stt_update_shapekeys_list(self, context):
                     item.stt_name = key_block.name
     print("Shapekeys list updated")
 
+def stt_validate_objects(stt_props):
+    """Проверяет источник и цель, возвращает текст ошибки или None"""
+    stt_source_obj = stt_props.stt_source_object
+    stt_target_obj = stt_props.stt_target_object
+
+    if not stt_source_obj or not stt_target_obj:
+        return "Source and Target objects must be set"
+    if stt_source_obj.type != 'MESH' or stt_target_obj.type != 'MESH':
+        return "Source and Target must be mesh objects"
+    if not stt_source_obj.data.shape_keys:
+        return "Source object has no shapekeys"
+    return None
+
+def stt_requested_keys(stt_props):
+    """Имена ключей источника, которые нужно перенести при текущем выборе"""
+    stt_selected_shapekeys = {item.stt_name for item in stt_props.stt_selected_shapekeys if item.stt_select}
+    return [key_block.name for key_block in stt_props.stt_source_object.data.shape_keys.key_blocks
+            if key_block.name != 'Basis' and (stt_props.stt_all_shapekeys or key_block.name in stt_selected_shapekeys)]
+
+def stt_transfer_shapekeys(stt_props, key_names):
+    """Переносит указанные ключи источника на цель"""
+    stt_source_obj = stt_props.stt_source_object
+    stt_target_obj = stt_props.stt_target_object
+    stt_source_mesh = stt_source_obj.data
+    stt_target_mesh = stt_target_obj.data
+    stt_source_shape_keys = stt_source_mesh.shape_keys.key_blocks
+
+    if not stt_target_mesh.shape_keys:
+        stt_target_obj.shape_key_add(name="Basis")
+
+    # Соседи и веса зависят только от базисов, поэтому считаем их один раз для всех ключей
+    stt_source_count = len(stt_source_mesh.vertices)
+    stt_target_count = len(stt_target_mesh.vertices)
+    stt_source_co = stt_read_coords(stt_source_mesh.vertices, stt_source_count)
+    stt_target_co = stt_read_coords(stt_target_mesh.vertices, stt_target_count)
+    cache_dir = stt_cache_dir() if stt_props.stt_use_cache else None
+    binding = stt_get_binding(stt_source_co, stt_target_co, stt_props.stt_neighbor_count, cache_dir)
+    valid = stt_binding_valid(binding)
+
+    transfer_keys = []
+    for name in key_names:
+        key_block = stt_source_shape_keys.get(name)
+        if not key_block:
+            continue
+
+        new_key = stt_target_mesh.shape_keys.key_blocks.get(name)
+        if not new_key:
+            new_key = stt_target_obj.shape_key_add(name=name)
+        new_key.value = 0.0
+        transfer_keys.append((key_block, new_key))
+
+    # Все смещения пачки ключей получаются одним умножением матрицы весов на (N_source x K x 3)
+    batch_size = max(1, STT_BATCH_ELEMENTS // max(1, len(binding[1]) * 3))
+    for start in range(0, len(transfer_keys), batch_size):
+        batch = transfer_keys[start:start + batch_size]
+        source_deltas = np.empty((stt_source_count, len(batch), 3), dtype=np.float32)
+        for i, (key_block, _) in enumerate(batch):
+            source_deltas[:, i] = stt_read_coords(key_block.data, stt_source_count) - stt_source_co
+
+        target_deltas = stt_transfer_deltas(binding, source_deltas)
+        for i, (_, new_key) in enumerate(batch):
+            key_co = stt_read_coords(new_key.data, stt_target_count)
+            key_co[valid] = stt_target_co[valid] + target_deltas[valid, i]
+            new_key.data.foreach_set("co", key_co.ravel())
+
+    stt_target_mesh.update()
+
+def stt_revert_shapekeys(target_obj, key_names):
+    """Возвращает указанные ключи цели к снимку, а добавленные переносом удаляет"""
+    snapshot = stt_get_snapshot(target_obj)
+    shape_keys = target_obj.data.shape_keys
+    if snapshot is None or not shape_keys:
+        return
+
+    original = {name: i for i, name in enumerate(snapshot["names"])}
+    for name in key_names:
+        key_block = shape_keys.key_blocks.get(name)
+        if not key_block:
+            continue
+        if name in original:
+            key_block.data.foreach_set("co", snapshot["keys"][original[name]].ravel())
+            key_block.value = snapshot["values"][original[name]]
+        else:
+            target_obj.shape_key_remove(key_block)
+
+    target_obj.data.update()
+
 def stt_update_preview(self, context):
     """Обновляет состояние превью"""
     print("Updating preview")
     stt_props = context.scene.stt_shapekey_transfer_props
     if self.stt_preview:
         stt_save_original_state(stt_props.stt_target_object)
-        bpy.ops.object.stt_transfer_shapekeys('INVOKE_DEFAULT')
+        stt_applied_keys.clear()
+        error = stt_validate_objects(stt_props)
+        if error:
+            print(error)
+        else:
+            key_names = stt_requested_keys(stt_props)
+            stt_transfer_shapekeys(stt_props, key_names)
+            stt_applied_keys.update(key_names)
     else:
         stt_restore_original_state(stt_props.stt_target_object)
+        if not disable_update:
+            stt_clear_snapshot(stt_props.stt_target_object)
     print("Preview updated")
 
 def stt_recalculate_shapekeys(self, context):
-    """Пересчитывает блендшейпы"""
+    """Пересчитывает блендшейпы, затрагивая только ключи с изменившимся выбором"""
     print("Recalculating shapekeys")
     stt_props = context.scene.stt_shapekey_transfer_props
     if stt_props.stt_preview:
-        stt_restore_original_state(stt_props.stt_target_object)
-        bpy.ops.object.stt_transfer_shapekeys('INVOKE_DEFAULT')
+        error = stt_validate_objects(stt_props)
+        if error:
+            print(error)
+            return
+
+        requested = stt_requested_keys(stt_props)
+        removed = stt_applied_keys.difference(requested)
+        added = [name for name in requested if name not in stt_applied_keys]
+
+        if removed:
+            stt_revert_shapekeys(stt_props.stt_target_object, removed)
+            stt_applied_keys.difference_update(removed)
+        if added:
+            stt_transfer_shapekeys(stt_props, added)
+            stt_applied_keys.update(added)
     print("Shapekeys recalculated")
 
 class STT_TransferShapekeysOperator(bpy.types.Operator):
@@ -155,63 +459,206 @@ class STT_TransferShapekeysOperator(bpy.types.Operator):
         """Выполняет перенос блендшейпов"""
         print("Executing transfer shapekeys")
         stt_props = context.scene.stt_shapekey_transfer_props
-        stt_source_obj = stt_props.stt_source_object
-        stt_target_obj = stt_props.stt_target_object
 
-        if not stt_source_obj or not stt_target_obj:
-            self.report({'ERROR'}, "Source and Target objects must be set")
+        error = stt_validate_objects(stt_props)
+        if error:
+            self.report({'ERROR'}, error)
             return {'CANCELLED'}
 
-        if stt_source_obj.type != 'MESH' or stt_target_obj.type != 'MESH':
-            self.report({'ERROR'}, "Source and Target must be mesh objects")
-            return {'CANCELLED'}
+        stt_transfer_shapekeys(stt_props, stt_requested_keys(stt_props))
 
-        stt_source_mesh = stt_source_obj.data
-        stt_target_mesh = stt_target_obj.data
+        self.report({'INFO'}, "Shapekeys transferred successfully")
+        print("Shapekeys transferred successfully")
+        return {'FINISHED'}
 
-        if not stt_source_mesh.shape_keys:
-            self.report({'ERROR'}, "Source object has no shapekeys")
+class STT_BackgroundTransfer:
+    """Фоновый перенос: расчёт идёт в потоке на массивах NumPy, запись в меш - в главном потоке"""
+
+    def __init__(self, target_obj, key_names, created_keys):
+        self.target_name = target_obj.name
+        self.key_names = key_names
+        self.created_keys = created_keys
+        self.originals = {}
+        self.results = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.finished = False
+        self.error = None
+        self.written = 0
+        self.binding_progress = (0, 0)
+        self.binding_done = False
+
+    def start(self, source_co, target_co, source_keys, neighbor_count, cache_dir):
+        thread = threading.Thread(target=self.run, args=(source_co, target_co, source_keys, neighbor_count, cache_dir), daemon=True)
+        thread.start()
+        self.timer = functools.partial(stt_apply_background_results, self)
+        bpy.app.timers.register(self.timer)
+
+    def run(self, source_co, target_co, source_keys, neighbor_count, cache_dir):
+        """Считает привязку и смещения всех ключей; никаких обращений к bpy"""
+        try:
+            binding = stt_get_binding(source_co, target_co, neighbor_count, cache_dir,
+                                      cancel_event=self.cancel_event, progress=self.report_binding_progress)
+            if binding is None:
+                return
+            self.binding_done = True
+            valid = stt_binding_valid(binding)
+            batch_size = max(1, STT_BATCH_ELEMENTS // max(1, len(binding[1]) * 3))
+            for start in range(0, len(self.key_names), batch_size):
+                if self.cancel_event.is_set():
+                    return
+                source_deltas = source_keys[start:start + batch_size].transpose(1, 0, 2) - source_co[:, None]
+                target_deltas = stt_transfer_deltas(binding, source_deltas)
+                for i, name in enumerate(self.key_names[start:start + batch_size]):
+                    self.results.put((name, valid, target_co[valid] + target_deltas[valid, i]))
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.results.put(None)
+
+    def report_binding_progress(self, done, total):
+        self.binding_progress = (done, total)
+
+    def cancel(self):
+        """Останавливает расчёт и возвращает уже записанные ключи к исходному виду"""
+        self.cancel_event.set()
+        if bpy.app.timers.is_registered(self.timer):
+            bpy.app.timers.unregister(self.timer)
+
+        target_obj = bpy.data.objects.get(self.target_name)
+        if not target_obj or not target_obj.data.shape_keys:
+            return
+        key_blocks = target_obj.data.shape_keys.key_blocks
+        for name, coords in self.originals.items():
+            key_block = key_blocks.get(name)
+            if key_block and name not in self.created_keys:
+                key_block.data.foreach_set("co", coords.ravel())
+        for name in reversed(self.created_keys):
+            key_block = key_blocks.get(name)
+            if key_block:
+                target_obj.shape_key_remove(key_block)
+        target_obj.data.update()
+
+def stt_apply_background_results(job):
+    """Таймер главного потока: записывает готовые ключи в меш пачками"""
+    target_obj = bpy.data.objects.get(job.target_name)
+    count = 0
+    while count < STT_KEYS_PER_TICK:
+        try:
+            item = job.results.get_nowait()
+        except queue.Empty:
+            break
+        if item is None:
+            job.finished = True
+            break
+        if job.cancel_event.is_set() or not target_obj or not target_obj.data.shape_keys:
+            continue
+
+        name, valid, coords = item
+        key_block = target_obj.data.shape_keys.key_blocks.get(name)
+        if key_block:
+            key_co = stt_read_coords(key_block.data, len(key_block.data))
+            job.originals[name] = key_co.copy()
+            key_co[valid] = coords
+            key_block.data.foreach_set("co", key_co.ravel())
+        job.written += 1
+        count += 1
+
+    if count and target_obj:
+        target_obj.data.update()
+    return None if job.finished else 0.05
+
+class STT_TransferShapekeysModalOperator(bpy.types.Operator):
+    bl_idname = "object.stt_transfer_shapekeys_modal"
+    bl_label = "Transfer Shapekeys in Background"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        """Без окна выполняет обычный перенос"""
+        stt_props = context.scene.stt_shapekey_transfer_props
+        error = stt_validate_objects(stt_props)
+        if error:
+            self.report({'ERROR'}, error)
             return {'CANCELLED'}
 
-        stt_source_shape_keys = stt_source_mesh.shape_keys.key_blocks
-        if not stt_target_mesh.shape_keys:
-            stt_target_obj.shape_key_add(name="Basis")
+        stt_transfer_shapekeys(stt_props, stt_requested_keys(stt_props))
+        self.report({'INFO'}, "Shapekeys transferred successfully")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        """Запускает перенос в фоновом потоке"""
+        print("Starting background shapekey transfer")
+        stt_props = context.scene.stt_shapekey_transfer_props
 
-        stt_selected_shapekeys = [item.stt_name for item in stt_props.stt_selected_shapekeys if item.stt_select]
+        error = stt_validate_objects(stt_props)
+        if error:
+            self.report({'ERROR'}, error)
+            return {'CANCELLED'}
 
-        for key_block in stt_source_shape_keys:
-            if key_block.name == 'Basis' or (not stt_props.stt_all_shapekeys and key_block.name not in stt_selected_shapekeys):
-                continue
+        stt_source_mesh = stt_props.stt_source_object.data
+        stt_target_obj = stt_props.stt_target_object
+        stt_target_mesh = stt_target_obj.data
+        key_names = stt_requested_keys(stt_props)
 
-            new_key = stt_target_mesh.shape_keys.key_blocks.get(key_block.name)
+        # Ключи на цели создаются заранее, в фоне остаётся только заполнить их координаты
+        created_keys = []
+        if not stt_target_mesh.shape_keys:
+            stt_target_obj.shape_key_add(name="Basis")
+            created_keys.append(stt_target_mesh.shape_keys.key_blocks[0].name)
+        for name in key_names:
+            new_key = stt_target_mesh.shape_keys.key_blocks.get(name)
             if not new_key:
-                new_key = stt_target_obj.shape_key_add(name=key_block.name)
+                new_key = stt_target_obj.shape_key_add(name=name)
+                created_keys.append(new_key.name)
             new_key.value = 0.0
 
-            for target_vert in stt_target_mesh.vertices:
-                weights = []
-                deltas = []
-                for source_vert in stt_source_mesh.vertices:
-                    distance = (target_vert.co - source_vert.co).length
-                    weight = 1.0 / max(distance, 1e-6)
-                    if weight > 0.1:
-                        delta = stt_source_shape_keys[key_block.name].data[source_vert.index].co - source_vert.co
-                        weights.append(weight)
-                        deltas.append(delta)
-                
-                if weights:
-                    total_weight = sum(weights)
-                    normalized_weights = [w / total_weight for w in weights]
-
-                    final_delta = Vector((0.0, 0.0, 0.0))
-                    for weight, delta in zip(normalized_weights, deltas):
-                        final_delta += delta * weight
-
-                    new_key.data[target_vert.index].co = target_vert.co + final_delta
+        stt_source_count = len(stt_source_mesh.vertices)
+        stt_source_co = stt_read_coords(stt_source_mesh.vertices, stt_source_count)
+        stt_target_co = stt_read_coords(stt_target_mesh.vertices, len(stt_target_mesh.vertices))
+        source_keys = np.empty((len(key_names), stt_source_count, 3), dtype=np.float32)
+        for i, name in enumerate(key_names):
+            source_keys[i] = stt_read_coords(stt_source_mesh.shape_keys.key_blocks[name].data, stt_source_count)
+
+        self._job = STT_BackgroundTransfer(stt_target_obj, key_names, created_keys)
+        self._job.start(stt_source_co, stt_target_co, source_keys, stt_props.stt_neighbor_count,
+                        stt_cache_dir() if stt_props.stt_use_cache else None)
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(0.1, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        """Показывает прогресс в строке состояния и отменяет перенос по Esc"""
+        job = self._job
+
+        if event.type == 'ESC':
+            job.cancel()
+            self.finish(context)
+            self.report({'WARNING'}, "Shapekey transfer cancelled")
+            print("Shapekey transfer cancelled")
+            return {'CANCELLED'}
 
-        self.report({'INFO'}, "Shapekeys transferred successfully")
-        print("Shapekeys transferred successfully")
-        return {'FINISHED'}
+        if event.type == 'TIMER':
+            if job.binding_done:
+                context.workspace.status_text_set(f"Transferring shapekeys: {job.written}/{len(job.key_names)} (Esc to cancel)")
+            else:
+                done, total = job.binding_progress
+                context.workspace.status_text_set(f"Binding vertices: {done}/{total} (Esc to cancel)")
+            if job.finished:
+                self.finish(context)
+                if job.error:
+                    job.cancel()
+                    self.report({'ERROR'}, f"Shapekey transfer failed: {job.error}")
+                    return {'CANCELLED'}
+                self.report({'INFO'}, "Shapekeys transferred successfully")
+                print("Shapekeys transferred successfully")
+                return {'FINISHED'}
+
+        return {'PASS_THROUGH'}
+
+    def finish(self, context):
+        context.window_manager.event_timer_remove(self._timer)
+        context.workspace.status_text_set(None)
 
 class STT_RestoreOriginalShapekeysOperator(bpy.types.Operator):
     bl_idname = "object.stt_restore_original_shapekeys"
@@ -266,6 +713,9 @@ class STT_ShapekeyTransferPanel(bpy.types.Panel):
         # Отключаем возможность выбора объектов при активном превью
         layout.enabled = not stt_props.stt_preview
         layout.prop(stt_props, "stt_all_shapekeys")
+        layout.prop(stt_props, "stt_neighbor_count")
+        layout.prop(stt_props, "stt_use_cache")
+        layout.prop(stt_props, "stt_persist_snapshot")
         layout.enabled = True  # Включаем остальные элементы
 
         if not stt_props.stt_all_shapekeys:
@@ -275,21 +725,41 @@ class STT_ShapekeyTransferPanel(bpy.types.Panel):
 
         layout.prop(stt_props, "stt_preview", toggle=True, text="Preview")
         layout.operator("object.stt_transfer_shapekeys", text="Apply")
+        layout.operator("object.stt_transfer_shapekeys_modal", text="Apply in Background")
 
 def stt_reset_preview():
-    """Сбрасывает состояние превью при регистрации плагина без вызова обработчика"""
+    """Приводит состояние превью в соответствие с открытым файлом без вызова обработчика"""
     global disable_update
     props = bpy.context.scene.stt_shapekey_transfer_props
+    if not props.stt_preview:
+        return
+
+    target_obj = props.stt_target_object
+    if target_obj and STT_SNAPSHOT_PROP in target_obj:
+        if not stt_validate_objects(props):
+            # Превью сохранено вместе со снимком: оно остаётся включённым, выключение вернёт цель из снимка
+            stt_applied_keys.update(stt_requested_keys(props))
+            return
+        # Продолжить превью нельзя, поэтому цель возвращается к снимку
+        stt_restore_original_state(target_obj)
+        stt_clear_snapshot(target_obj)
+
     disable_update = True
     props.stt_preview = False
     disable_update = False
 
+@persistent
+def stt_load_post_handler(dummy):
+    """Снимки и перенесённые ключи относятся к закрытому файлу"""
+    stt_snapshots.clear()
+    stt_applied_keys.clear()
+    stt_reset_preview()
+
 classes = (
-    STT_OriginalPosition,
-    STT_OriginalShapeKey,
     STT_ShapekeyItem,
     STT_ShapekeyTransferProperties,
     STT_TransferShapekeysOperator,
+    STT_TransferShapekeysModalOperator,
     STT_RestoreOriginalShapekeysOperator,
     STT_UpdateShapekeysListOperator,
     STT_ShapekeyTransferPanel,
@@ -300,9 +770,13 @@ def register():
         bpy.utils.register_class(cls)
     bpy.types.Scene.stt_shapekey_transfer_props = bpy.props.PointerProperty(type=STT_ShapekeyTransferProperties)
     bpy.app.timers.register(stt_reset_preview)
+    if stt_load_post_handler not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(stt_load_post_handler)
     print("Shapekey Transfer Tool registered")
 
 def unregister():
+    if stt_load_post_handler in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(stt_load_post_handler)
     del bpy.types.Scene.stt_shapekey_transfer_props
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)